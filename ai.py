@@ -1,5 +1,16 @@
 import math
-from minimax import minimax
+import threading
+import time
+from board import Board, Geometry
+from eval_cache import EvaluationCache
+from evaluation import IncrementalEvaluator
+from minimax import (
+    SearchCancelled, SearchContext, SearchTimeout, iterative_deepening, minimax, orient, position_key
+)
+from ordering import MoveOrdering, center_order
+from stats import SearchStats, profiled
+from threats import ThreatAnalyzer
+from transposition import TranspositionTable
 
 
 class AIPlayer:
@@ -10,34 +21,314 @@ class AIPlayer:
         piece (str): The player's game piece token.
         opponent_piece (str): The opposing player's piece.
         difficulty (str): The difficulty level of the computer, affecting depth of simulation.
+        time_limit_ms (float): Thinking time per move. If set, the computer deepens its search
+            until the time runs out instead of searching to the difficulty's fixed depth. At
+            the solver difficulty it covers both the solver and, if the solver does not
+            finish, the deepening search played instead.
+        weights (Weights): Heuristic weights, or None for the defaults.
+        threats (ThreatAnalyzer): Threat scan used to prune the search and score its leaves.
+        parallel (ParallelSearch): Process pool that searches the root moves in parallel,
+            or None to search serially. Only used by fixed-depth searches of PARALLEL_MIN_DEPTH
+            or more: with time_limit_ms set, the search deepens serially.
+        timing (bool): Time evaluation and move generation during searches.
+        profile (str): "cprofile" or "tracemalloc" to profile every search, or None.
+        profile_path (str): File the profile report of the latest search is written to.
+        ponder (bool): Search the opponent's likely replies while they think, so the answer
+            to their move is already in the transposition table. Not done at the solver difficulty.
+        database (PositionDatabase): Evaluated positions whose stored best move is played
+            without searching, or None.
         name (str): Name of the computer.
+        last_stats (SearchStats): Counters from the most recent search.
+        last_depth (int): Depth reached by the most recent search.
+        last_value (float): Value of the most recent move: the heuristic score, or a win score
+            for a forced win or loss (see minimax.is_win_score()). Solved positions and those
+            from the database score 0 for a draw and a win score otherwise.
+        table (TranspositionTable): Searched positions, kept between moves of a game.
+        eval_cache (EvaluationCache): Leaf scores, kept between moves of a game, or None if
+            eval_cache_bytes was 0.
+        solver (Solver): Exact solver for the solver difficulty, created on first use.
+        ponder_stats (SearchStats): Counters from the current or most recent pondering.
     """
 
-    def __init__(self, piece, difficulty="hard"):
+    # Search depth for each difficulty preset
+    DIFFICULTY_DEPTHS = {
+        "easy": 1,
+        "medium": 2,
+        "hard": 4,
+        "very hard": 6,
+        # Plays exactly when the solver finishes in time, and like "very hard" when it does not.
+        # The depth is only used when the solver runs out of time and no time limit is set
+        "solver": 6,
+    }
+    # Other names accepted for a difficulty. "perfect" was the solver difficulty's first name
+    DIFFICULTY_ALIASES = {"perfect": "solver"}
+    # Time the solver gets before the solver difficulty falls back to the heuristic search
+    SOLVER_TIME_LIMIT_MS = 3000
+    # Most empty cells the solver is started with, unless the opening book covers the position.
+    # On the standard board the solver takes up to about 1.5 s with 24 empty cells and 3 s or
+    # more with 25, so with more it would run out of time and only delay the fallback search
+    SOLVER_MAX_EMPTY_CELLS = 24
+    # Share of time_limit_ms the solver gets at the solver difficulty; the rest is left for
+    # deepening the heuristic search if it does not finish
+    SOLVER_SHARE = 0.5
+    # Shallower searches finish faster than work can be handed to other processes
+    PARALLEL_MIN_DEPTH = 4
+
+    def __init__(
+        self,
+        piece,
+        difficulty="hard",
+        time_limit_ms=None,
+        weights=None,
+        parallel=False,
+        timing=False,
+        profile=None,
+        profile_path="search_profile.txt",
+        ponder=False,
+        database=None,
+        eval_cache_bytes=16 << 20
+    ):
         self.piece = piece
         self.opponent_piece = "X" if piece == "O" else "O"
-        self.difficulty = difficulty.lower()
+        self.difficulty = AIPlayer.DIFFICULTY_ALIASES.get(difficulty.lower(), difficulty.lower())
+        self.time_limit_ms = time_limit_ms
+        self.weights = weights
+        self.threats = ThreatAnalyzer()
+        # The process pool and the database reader are only imported when asked for
+        self.parallel = None
+        if parallel:
+            from parallel import ParallelSearch
+            self.parallel = ParallelSearch()
+        self.timing = timing
+        self.profile = profile
+        self.profile_path = profile_path
+        self.ponder = ponder
+        if isinstance(database, str):
+            from positiondb import PositionDatabase
+            database = PositionDatabase(database)
+        self.database = database
         self.name="Computer"
+        self.last_stats = SearchStats()
+        self.last_depth = 0
+        self.last_value = None
+        self.table = TranspositionTable()
+        self.eval_cache = EvaluationCache(eval_cache_bytes) if eval_cache_bytes else None
+        self.solver = None
+        self.ponder_stats = SearchStats()
+        self.ponder_thread = None
+        self.ponder_stop = None
+        self.ponder_hash = None
+        # Held while pondering is started or stopped; reentrant as starting stops it first
+        self.ponder_lock = threading.RLock()
 
-    def get_move(self, board: object) -> int:
-        if self.difficulty == "easy":
-            depth = 1
-        elif self.difficulty == "medium":
-            depth = 2
-        elif self.difficulty == "hard":
-            depth = 4
-        elif self.difficulty == "very hard":
-            depth = 6
-        else:
+    def get_move(self, board: object, stop=None) -> int:
+        """Search for the best column to play.
+
+        stop is an optional threading.Event. Setting it from another thread makes the search
+        raise SearchCancelled at its next check.
+        """
+        if self.difficulty not in AIPlayer.DIFFICULTY_DEPTHS:
             raise ValueError("Invalid AI difficulty level.")
+        depth = AIPlayer.DIFFICULTY_DEPTHS[self.difficulty]
+        # Pondering shares the transposition table, so it has to finish first
+        self.stop_pondering()
+
+        if self.database is not None:
+            stored = self.database.lookup(board, self.piece)
+            if stored is not None and stored[1] is not None:
+                self.last_stats = SearchStats(self.timing)
+                self.last_depth = 0
+                # Stored scores are the solver's
+                from solver import search_score
+                self.last_value = search_score(stored[0], len(board.moves), board.geometry)
+                return stored[1]
+
+        # Search a private copy so the caller's board is never touched mid-search
+        self.last_stats = SearchStats(self.timing)
+        created = Board.created
+        search_board = board.copy()
+        context = SearchContext(
+            self.last_stats,
+            self.table,
+            MoveOrdering(columns=search_board.columns),
+            IncrementalEvaluator(search_board, self.piece, self.weights),
+            stop,
+            threats=self.threats,
+            eval_cache=self.eval_cache
+        )
 
-        column, _ = minimax(
+        try:
+            if self.profile is None:
+                return self.search(search_board, depth, context)
+            with profiled(self.profile, self.profile_path):
+                return self.search(search_board, depth, context)
+        finally:
+            self.last_stats.allocations += Board.created - created
+
+    def reset(self) -> None:
+        """Forget the positions of the previous game before starting a new one."""
+        self.stop_pondering()
+        self.table.clear()
+        if self.eval_cache is not None:
+            self.eval_cache.clear()
+        # The workers keep their own tables; the pool starts afresh on the next parallel search
+        if self.parallel is not None:
+            self.parallel.shutdown()
+
+    def shutdown(self) -> None:
+        """Stop pondering and the parallel search's worker processes. Call when done with the player."""
+        self.stop_pondering()
+        if self.parallel is not None:
+            self.parallel.shutdown()
+
+    def search(self, board: object, depth: int, context: SearchContext) -> int:
+        """Run the search the player is configured for on a board it may modify."""
+        stop = context.stop
+        time_limit_ms = self.time_limit_ms
+        if self.difficulty == "solver":
+            start = time.perf_counter()
+            column = self.solve(board, stop)
+            if column is not None:
+                return column
+            if time_limit_ms is not None:
+                time_limit_ms -= (time.perf_counter() - start) * 1000
+        if time_limit_ms is not None:
+            column, self.last_value, self.last_depth = iterative_deepening(
+                board,
+                time_limit_ms=time_limit_ms,
+                ai_piece=self.piece,
+                player_piece=self.opponent_piece,
+                context=context
+            )
+            return column
+
+        if self.parallel is not None and depth >= AIPlayer.PARALLEL_MIN_DEPTH:
+            column, self.last_value = self.parallel.search(
+                board,
+                depth,
+                self.piece,
+                self.opponent_piece,
+                weights=self.weights,
+                stats=self.last_stats,
+                stop=stop
+            )
+            self.last_depth = depth
+            return column
+
+        column, self.last_value = minimax(
             board,
             depth=depth,
             alpha=-math.inf,
             beta=math.inf,
             maximizing_player=True,
             ai_piece=self.piece,
-            player_piece=self.opponent_piece
+            player_piece=self.opponent_piece,
+            context=context
         )
+        self.last_depth = depth
+        return column
+
+    def solve(self, board: object, stop=None) -> int | None:
+        """Find the best move with the exact solver.
+
+        Returns None if the solver could not finish within SOLVER_TIME_LIMIT_MS, or within
+        its share of time_limit_ms if that is set. Positions with more than
+        SOLVER_MAX_EMPTY_CELLS empty cells that the opening book does not cover are not tried.
+        """
+        # Only the solver difficulty needs the solver, so it is imported here
+        from solver import OpeningBook, Solver, search_score
+        if self.solver is None or self.solver.geometry is not board.geometry:
+            # Opening books are only kept for the standard board
+            book = OpeningBook() if board.geometry is Geometry.get() else None
+            self.solver = Solver(book=book, geometry=board.geometry)
+        if board.geometry.cells - len(board.moves) > AIPlayer.SOLVER_MAX_EMPTY_CELLS:
+            current = board.bitboards[self.piece]
+            mask = board.bitboards["X"] | board.bitboards["O"]
+            if self.solver.book is None or not self.solver.book.covers(current, mask, len(board.moves)):
+                return None
+        if self.time_limit_ms is None:
+            time_limit_ms = AIPlayer.SOLVER_TIME_LIMIT_MS
+        else:
+            time_limit_ms = self.time_limit_ms * AIPlayer.SOLVER_SHARE
+
+        self.solver.stop = stop
+        self.solver.deadline = time.perf_counter() + time_limit_ms / 1000
+        nodes = self.solver.nodes
+        try:
+            column, score = self.solver.best_move(board, self.piece)
+            self.last_value = search_score(score, len(board.moves), board.geometry)
+            self.last_depth = board.geometry.cells - len(board.moves)
+        except SearchTimeout:
+            column = None
+        finally:
+            self.solver.deadline = None
+            self.last_stats.nodes += self.solver.nodes - nodes
         return column
+
+    def start_pondering(self, board: object) -> None:
+        """Start searching the opponent's replies on a background thread.
+
+        Does nothing if the player is already pondering this position, or at the solver
+        difficulty: the solver keeps its own cache, which the heuristic search cannot fill.
+        """
+        if self.difficulty == "solver":
+            return
+        with self.ponder_lock:
+            if self.ponder_thread is not None and self.ponder_hash == board.hash:
+                return
+            self.stop_pondering()
+            self.ponder_hash = board.hash
+            self.ponder_stop = threading.Event()
+            self.ponder_thread = threading.Thread(
+                target=self._ponder, args=(board.copy(), self.ponder_stop), daemon=True)
+            self.ponder_thread.start()
+
+    def stop_pondering(self) -> None:
+        """Stop pondering and wait for the background search to finish.
+
+        Safe to call from several threads at once: the window calls it to cancel the
+        computer's turn while the search thread calls it to start searching.
+        """
+        with self.ponder_lock:
+            if self.ponder_thread is not None:
+                self.ponder_stop.set()
+                self.ponder_thread.join()
+            self.ponder_thread = None
+            self.ponder_stop = None
+            self.ponder_hash = None
+
+    def _ponder(self, board: object, stop: threading.Event) -> None:
+        """Deepen the search of every reply in turn, most likely reply first."""
+        if self.time_limit_ms is None:
+            max_depth = AIPlayer.DIFFICULTY_DEPTHS[self.difficulty]
+        else:
+            max_depth = board.geometry.cells - len(board.moves) - 1
+
+        replies = [col for col in center_order(board.columns) if board.is_valid_move(col)]
+        # The reply the last search expected comes first
+        key, mirrored = position_key(board, False)
+        entry = self.table.probe(key, mirrored)
+        if entry is not None and orient(board, entry[3], mirrored) in replies:
+            replies.remove(orient(board, entry[3], mirrored))
+            replies.insert(0, orient(board, entry[3], mirrored))
+
+        self.ponder_stats = SearchStats()
+        try:
+            for depth in range(1, max_depth + 1):
+                for col in replies:
+                    board.play(col, self.opponent_piece)
+                    if not board.winning_move(self.opponent_piece) and not board.is_full():
+                        context = SearchContext(
+                            self.ponder_stats,
+                            self.table,
+                            MoveOrdering(columns=board.columns),
+                            IncrementalEvaluator(board, self.piece, self.weights),
+                            stop,
+                            threats=self.threats,
+                            eval_cache=self.eval_cache
+                        )
+                        minimax(board, depth, -math.inf, math.inf, True,
+                                self.piece, self.opponent_piece, context)
+                    board.undo()
+        except SearchCancelled:
+            pass
@@ -0,0 +1,259 @@
+"""Bulk analysis of recorded games.
+
+Streams a JSON Lines file of game records (see record.py; arena output works too), scores
+every position with the engine in a pool of worker processes, and streams one line per game
+to the output as soon as it is analyzed:
+
+    {"game": 0, "moves": "3324", "first": "X", "evals": [0, 21, -4, 17, 9],
+     "best": [3, 3, 2, 4], "loss": [0, 0, 13, 0], "blunders": []}
+
+"evals" scores each position from the start to the end of the game for X, with the search
+values of minimax(): heuristic scores, or win scores for forced results. "best" is the move
+the engine prefers in each position before a move, and "loss" how much each move made
+lost for the player who made it. "blunders" lists the moves, by index, that lost at least
+--threshold, threw away a forced win or walked into a forced loss. A line that is not a
+valid record, or whose moves cannot be played, gets {"game": i, "error": ...} instead, and
+the other games are analyzed as usual.
+
+    python -m analyze games.jsonl --output analysis.jsonl --depth 6
+    python -m analyze games.jsonl --static
+
+--static adds "static", the heuristic score of each position for X without any search, like
+score_position(). The positions of a game are scored together in one call to the NumPy batch
+evaluator, so this needs NumPy.
+
+Games are handed to the workers in chunks. Each worker keeps its transposition table and
+the positions it has scored between games, so the openings most games share are only
+searched once per worker. The table only answers a node with an entry searched to the same
+depth, so the values do not depend on the order of the games or how they are shared out.
+Where moves are equally good, "best" may name a different one of them from run to run.
+"""
+import argparse
+import json
+import math
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from board import Board
+from evaluation import IncrementalEvaluator
+from minimax import SearchContext, is_win_score, minimax, orient, position_key, win_score
+from ordering import MoveOrdering
+from record import GameRecord
+from threats import ThreatAnalyzer
+from transposition import TranspositionTable
+
+# Transposition table entries each worker keeps per board size
+WORKER_TABLE_SIZE = 1 << 20
+# Scored positions each worker remembers before starting over
+WORKER_CACHE_SIZE = 1 << 20
+# Loss that makes a move a blunder, in heuristic points
+BLUNDER_THRESHOLD = 100
+
+# Set in each worker process: the transposition table of each board size, and the search
+# result of every position scored so far, shared by every game the worker analyzes
+_worker_tables = None
+_worker_results = None
+_worker_threats = None
+
+
+def _init_worker() -> None:
+    global _worker_tables, _worker_results, _worker_threats
+    _worker_tables = {}
+    _worker_results = {}
+    _worker_threats = ThreatAnalyzer()
+
+
+def evaluate_position(board: Board, depth: int, first: str = "X") -> tuple[int | None, float]:
+    """The engine's best move in a position and the position's value for X.
+
+    first is the piece that moves first in the game, which only the empty board does not show.
+    Runs in a worker process and reuses the worker's caches.
+    """
+    piece = board.next_piece(board.moves[0][1] if board.moves else first)
+    opponent = "X" if piece == "O" else "O"
+    if board.moves and board.winning_move(opponent):
+        return None, win_score(board) if opponent == "X" else -win_score(board)
+    if board.is_full():
+        return None, 0
+
+    # Values are always searched for X, so the side to move is part of the key
+    key, mirrored = position_key(board, piece == "X")
+    cached = _worker_results.get((board.geometry, key, depth))
+    if cached is not None:
+        return orient(board, cached[0], mirrored), cached[1]
+
+    if board.geometry not in _worker_tables:
+        _worker_tables[board.geometry] = TranspositionTable(WORKER_TABLE_SIZE)
+    context = SearchContext(
+        table=_worker_tables[board.geometry],
+        ordering=MoveOrdering(columns=board.columns),
+        evaluator=IncrementalEvaluator(board, "X"),
+        threats=_worker_threats,
+        exact_depth=True
+    )
+    column, value = minimax(board, depth, -math.inf, math.inf, piece == "X", "X", "O", context)
+
+    if len(_worker_results) >= WORKER_CACHE_SIZE:
+        _worker_results.clear()
+    _worker_results[(board.geometry, key, depth)] = (orient(board, column, mirrored), value)
+    return column, value
+
+
+def is_blunder(before: float, after: float, threshold: float) -> bool:
+    """Whether a move is a blunder, from the values for its player before and after it."""
+    if is_win_score(before) and before > 0:
+        return not (is_win_score(after) and after > 0)
+    if is_win_score(after) and after < 0:
+        return not (is_win_score(before) and before < 0)
+    return before - after >= threshold
+
+
+def analyze_game(index: int, record: GameRecord, depth: int, threshold: float, static: bool = False) -> dict:
+    """Scores every position of one game. Runs in a worker process."""
+    first = record.first
+    board = Board(record.rows, record.columns, record.connect)
+    moves = record.moves
+    pieces = (first, "X" if first == "O" else "O")
+
+    best = []
+    evals = []
+    bitboards = []
+    for i in range(len(moves) + 1):
+        column, value = evaluate_position(board, depth, first)
+        evals.append(value)
+        bitboards.append((board.bitboards["X"], board.bitboards["O"]))
+        if i == len(moves):
+            break
+        best.append(column)
+        col = int(moves[i])
+        if not board.is_valid_move(col) or board.winning_move(pieces[(i + 1) % 2]):
+            raise ValueError(f"Illegal move {col} at position {i} of {moves!r}.")
+        board.play(col, pieces[i % 2])
+
+    loss = []
+    blunders = []
+    for i in range(len(moves)):
+        sign = 1 if pieces[i % 2] == "X" else -1
+        before, after = sign * evals[i], sign * evals[i + 1]
+        loss.append(max(0, before - after))
+        if is_blunder(before, after, threshold):
+            blunders.append(i)
+
+    analysis = {
+        "game": index,
+        "moves": moves,
+        "first": first,
+        "evals": evals,
+        "best": best,
+        "loss": loss,
+        "blunders": blunders,
+    }
+    if static:
+        from batch_evaluation import BatchEvaluator
+        own, opponent = zip(*bitboards)
+        analysis["static"] = BatchEvaluator(geometry=board.geometry).score_bitboards(own, opponent).tolist()
+    return analysis
+
+
+def _analyze_chunk(chunk: list[tuple[int, str]], depth: int, threshold: float, static: bool) -> list[dict]:
+    # Lines are read here rather than in the parent, so a bad one only costs its own game
+    results = []
+    for index, line in chunk:
+        try:
+            record = GameRecord.from_dict(json.loads(line))
+            results.append(analyze_game(index, record, depth, threshold, static))
+        except ValueError as error:
+            results.append({"game": index, "error": str(error)})
+    return results
+
+
+def _chunks(lines, size: int):
+    """Groups the non-blank lines into lists of (index, line)."""
+    chunk = []
+    for index, line in enumerate(line for line in lines if line.strip()):
+        chunk.append((index, line))
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def run(
+    lines,
+    output,
+    depth: int = 6,
+    threshold: float = BLUNDER_THRESHOLD,
+    workers: int | None = None,
+    chunk_size: int = 16,
+    static: bool = False
+) -> dict:
+    """Analyzes the games read from lines in a process pool, writing each one to output.
+
+    Only a few chunks per worker are read ahead, so memory use does not grow with the input.
+    Games are written in the order they finish.
+    """
+    workers = workers or os.cpu_count() or 1
+    summary = {"games": 0, "positions": 0, "blunders": 0, "errors": 0}
+    start = time.perf_counter()
+
+    def write(done) -> None:
+        for future in done:
+            for game in future.result():
+                output.write(json.dumps(game) + "\n")
+                summary["games"] += 1
+                if "error" in game:
+                    summary["errors"] += 1
+                else:
+                    summary["positions"] += len(game["evals"])
+                    summary["blunders"] += len(game["blunders"])
+        output.flush()
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        pending = set()
+        for chunk in _chunks(lines, chunk_size):
+            pending.add(executor.submit(_analyze_chunk, chunk, depth, threshold, static))
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                write(done)
+        write(wait(pending).done)
+
+    summary["seconds"] = time.perf_counter() - start
+    summary["positions_per_second"] = summary["positions"] / summary["seconds"] if summary["seconds"] else 0.0
+    return summary
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Score every position of recorded games.")
+    parser.add_argument("games", help="JSON Lines file of game records, or - for stdin.")
+    parser.add_argument("--output", default="-", help="Where to write the analysis. Defaults to stdout.")
+    parser.add_argument("--depth", type=int, default=6, help="Search depth of each position.")
+    parser.add_argument("--threshold", type=float, default=BLUNDER_THRESHOLD,
+                        help="Loss that makes a move a blunder.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=16, help="Games handed to a worker at a time.")
+    parser.add_argument("--static", action="store_true",
+                        help="Also give the heuristic score of every position, without searching. Needs NumPy.")
+    args = parser.parse_args(argv)
+    if args.static:
+        try:
+            import numpy
+        except ImportError:
+            parser.error("--static needs NumPy: pip install -r requirements-analysis.txt")
+
+    games = sys.stdin if args.games == "-" else open(args.games)
+    output = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        summary = run(games, output, args.depth, args.threshold, args.workers, args.chunk_size,
+                      args.static)
+    finally:
+        if games is not sys.stdin:
+            games.close()
+        if output is not sys.stdout:
+            output.close()
+    sys.stderr.write(json.dumps(summary, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Headless self-play arena for the computer player.
+
+Plays two engine configurations against each other over many games in a process pool, and
+streams every game to a JSON Lines file as it finishes. An engine configuration is a JSON
+object of AIPlayer keyword arguments.
+
+    python -m arena --a '{"difficulty": "hard"}' --b '{"difficulty": "very hard"}' --games 1000
+"""
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from ai import AIPlayer
+from board import Board
+
+
+def random_opening(board: Board, plies: int, rng: random.Random) -> str:
+    """Plays random moves that do not end the game. Returns them as a move string."""
+    moves = ""
+    while len(moves) < plies:
+        piece = board.next_piece()
+        candidates = [col for col in range(board.columns) if board.is_valid_move(col)]
+        rng.shuffle(candidates)
+        for col in candidates:
+            board.play(col, piece)
+            if not board.winning_move(piece):
+                moves += str(col)
+                break
+            board.undo()
+        else:
+            break
+    return moves
+
+
+def play_game(index: int, config_a: dict, config_b: dict, opening_plies: int, seed: int) -> dict:
+    """Plays one game between engine A and engine B.
+
+    A plays first in even-numbered games and second in odd-numbered ones.
+    """
+    rng = random.Random(seed * 1_000_003 + index)
+    board = Board()
+    opening = random_opening(board, opening_plies, rng)
+
+    a_piece = "X" if index % 2 == 0 else "O"
+    b_piece = "O" if a_piece == "X" else "X"
+    players = {a_piece: ("a", AIPlayer(a_piece, **config_a)),
+               b_piece: ("b", AIPlayer(b_piece, **config_b))}
+
+    moves = []
+    winner = None
+    try:
+        while not board.is_full():
+            piece = board.next_piece()
+            name, player = players[piece]
+            start = time.perf_counter()
+            col = player.get_move(board)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            board.play(col, piece)
+            moves.append({
+                "engine": name,
+                "column": col,
+                "ms": elapsed_ms,
+                "nodes": player.last_stats.nodes,
+                "depth": player.last_depth,
+            })
+            if board.winning_move(piece):
+                winner = name
+                break
+    finally:
+        for _, player in players.values():
+            player.shutdown()
+
+    return {
+        "game": index,
+        "a_piece": a_piece,
+        "opening": opening,
+        "moves": "".join(str(col) for col, _ in board.moves),
+        "move_stats": moves,
+        "winner": winner,
+    }
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, max(0, math.ceil(fraction * len(values)) - 1))
+    return values[index]
+
+
+def elo_difference(score: float) -> float:
+    """Rating difference implied by a score fraction, e.g. 0.64 is about +100."""
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+def summarize(games: list[dict]) -> dict:
+    wins = sum(1 for game in games if game["winner"] == "a")
+    losses = sum(1 for game in games if game["winner"] == "b")
+    draws = len(games) - wins - losses
+    score = (wins + draws / 2) / len(games) if games else 0.5
+
+    latency = {}
+    for engine in ("a", "b"):
+        times = [move["ms"] for game in games for move in game["move_stats"] if move["engine"] == engine]
+        latency[engine] = {
+            "p50_ms": percentile(times, 0.5),
+            "p90_ms": percentile(times, 0.9),
+            "p99_ms": percentile(times, 0.99),
+            "max_ms": max(times, default=0.0),
+        }
+
+    return {
+        "games": len(games),
+        "a_wins": wins,
+        "draws": draws,
+        "a_losses": losses,
+        "a_score": score,
+        "elo_difference": elo_difference(score),
+        "latency": latency,
+    }
+
+
+def run(
+    config_a: dict,
+    config_b: dict,
+    games: int,
+    output: str,
+    workers: int | None = None,
+    opening_plies: int = 2,
+    seed: int = 0
+) -> dict:
+    """Plays the games in a process pool, writing each one to output as it finishes."""
+    results = []
+    with open(output, "w") as f, ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(play_game, index, config_a, config_b, opening_plies, seed)
+                   for index in range(games)]
+        for future in as_completed(futures):
+            game = future.result()
+            f.write(json.dumps(game) + "\n")
+            f.flush()
+            results.append(game)
+    return summarize(results)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Play two computer players against each other.")
+    parser.add_argument("--a", type=json.loads, default={"difficulty": "hard"},
+                        help="AIPlayer arguments of engine A, as JSON.")
+    parser.add_argument("--b", type=json.loads, default={"difficulty": "very hard"},
+                        help="AIPlayer arguments of engine B, as JSON.")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--opening-plies", type=int, default=2,
+                        help="Random moves played before the engines take over.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="arena.jsonl")
+    args = parser.parse_args(argv)
+
+    summary = run(args.a, args.b, args.games, args.output, args.workers, args.opening_plies, args.seed)
+    sys.stdout.write(json.dumps(summary, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
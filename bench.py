@@ -0,0 +1,301 @@
+"""Headless benchmark of the computer player.
+
+Runs AIPlayer.get_move() over a fixed set of positions at each difficulty and prints the
+results as JSON, so runs from different commits can be compared. No window is opened.
+
+    python -m bench
+    python -m bench --difficulties hard "very hard" --output results.json
+    python -m bench --geometries 6x7 7x8 8x9 9x10
+    python -m bench --imports
+    python -m bench --parallel --positions opening midgame --depth 8 --cores 1 2 4
+    python -m bench --ordering --depth 6
+    python -m bench --windows --depth 8
+
+--imports instead times importing the engine in a fresh interpreter, and exits with an error
+if it takes longer than IMPORT_BUDGET_MS or loads pygame.
+
+--parallel instead times the root-parallel search of each position at --depth against the
+serial search, with each number of worker processes in --cores.
+
+--ordering instead counts the nodes a search of each position to --depth visits with and
+without move ordering.
+
+--windows instead counts the nodes that deepening to --depth visits with principal variation
+search and aspiration windows and with full-window alpha-beta, with the null-window searches,
+re-searches and aspiration failures of the former.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+from ai import AIPlayer
+from board import Board
+from evaluation import IncrementalEvaluator
+from minimax import SearchContext, iterative_deepening, minimax
+from ordering import MoveOrdering
+from threats import ThreatAnalyzer
+from transposition import TranspositionTable
+
+# Test positions as strings of columns played in turn, starting with X
+POSITIONS = {
+    "empty": "",
+    "opening": "33",
+    "opening-8": "36466334",
+    "midgame": "6411643546103210",
+    "midgame-24": "400011406323461415230504",
+    "endgame": "360115000363154134156146404420",
+}
+
+# Board sizes as rows, columns and pieces in a row needed to win
+GEOMETRIES = {
+    "6x7": (6, 7, 4),
+    "7x8": (7, 8, 4),
+    "8x9": (8, 9, 4),
+    "9x10": (9, 10, 4),
+}
+
+# The standard positions are only meaningful on the standard board, so larger boards are
+# benchmarked from the start and after both players take the center
+GEOMETRY_POSITIONS = {
+    "6x7": POSITIONS,
+    "7x8": {"empty": "", "opening": "44"},
+    "8x9": {"empty": "", "opening": "44"},
+    "9x10": {"empty": "", "opening": "55"},
+}
+
+DIFFICULTIES = ["easy", "medium", "hard", "very hard"]
+
+# Modules a tool needs to use the engine without a window
+ENGINE_MODULES = ["board", "minimax", "ai"]
+# Time importing each engine module may take, in milliseconds: about twice what the slowest
+# takes, so that a busy machine does not fail the check
+IMPORT_BUDGET_MS = 20
+# Depth of the searches timed by --parallel, deep enough for the workers to pay off
+PARALLEL_DEPTH = 8
+# Depth of the searches counted by --ordering; the unordered search grows fast with depth
+ORDERING_DEPTH = 6
+# Depth of the searches counted by --windows
+WINDOWS_DEPTH = 8
+
+
+def run_case(moves: str, difficulty: str, repeat: int = 1, geometry: str = "6x7") -> dict:
+    """Times the computer's move in one position at one difficulty.
+
+    Every run uses a fresh player so the transposition table starts empty. Peak memory is
+    measured in a separate run, since tracing allocations slows the search down.
+    """
+    rows, columns, connect = GEOMETRIES[geometry]
+    board = Board.from_moves(moves, rows=rows, columns=columns, connect=connect)
+    piece = board.next_piece()
+
+    times = []
+    for _ in range(repeat):
+        player = AIPlayer(piece, difficulty)
+        start = time.perf_counter()
+        column = player.get_move(board)
+        times.append(time.perf_counter() - start)
+    seconds = min(times)
+    nodes = player.last_stats.nodes
+
+    tracemalloc.start()
+    AIPlayer(piece, difficulty).get_move(board)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "geometry": geometry,
+        "position": moves,
+        "difficulty": difficulty,
+        "depth": player.last_depth,
+        "move": column,
+        "nodes": nodes,
+        "seconds": seconds,
+        "nodes_per_second": nodes / seconds if seconds else 0.0,
+        "peak_memory_bytes": peak,
+        "table": player.table.as_dict(),
+        "eval_cache": player.eval_cache.as_dict(),
+    }
+
+
+def import_time(module: str, repeat: int = 5) -> dict:
+    """Times importing a module in a fresh interpreter, and checks that pygame stays unloaded.
+
+    Interpreter start-up is not counted. The fastest of repeat runs is reported.
+    """
+    code = (
+        "import json, sys, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module}\n"
+        "print(json.dumps([time.perf_counter() - start, 'pygame' in sys.modules]))\n"
+    )
+    # Let the first run write the bytecode cache, so the others do not time compiling
+    env = {name: value for name, value in os.environ.items() if name != "PYTHONDONTWRITEBYTECODE"}
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), env=env).stdout
+        runs.append(json.loads(output))
+    seconds, pygame_loaded = min(runs)
+    return {
+        "module": module,
+        "ms": seconds * 1000,
+        "budget_ms": IMPORT_BUDGET_MS,
+        "pygame": pygame_loaded,
+        "ok": seconds * 1000 <= IMPORT_BUDGET_MS and not pygame_loaded,
+    }
+
+
+def compare_move_ordering(board: Board, depth: int, ai_piece: str, player_piece: str) -> dict[str, int]:
+    """Counts the nodes a search of the board visits with and without move ordering."""
+    counts = {}
+    for name, ordering in (("unordered", None), ("ordered", MoveOrdering(columns=board.columns))):
+        context = SearchContext(ordering=ordering)
+        minimax(board, depth, -math.inf, math.inf, True, ai_piece, player_piece, context)
+        counts[name] = context.stats.nodes
+    counts["saved"] = counts["unordered"] - counts["ordered"]
+    return counts
+
+
+def compare_search_windows(board: Board, depth: int, ai_piece: str, player_piece: str) -> dict[str, int]:
+    """Counts the nodes iterative_deepening() visits to reach depth with and without the narrow
+    windows of principal variation search and aspiration search.
+
+    Both searches order moves and use a transposition table, as the computer player does.
+    Also gives the null-window searches, re-searches and aspiration failures of the narrow one.
+    """
+    counts = {}
+    for name, full_window in (("full_window", True), ("pvs", False)):
+        context = SearchContext(
+            table=TranspositionTable(),
+            ordering=MoveOrdering(columns=board.columns),
+            evaluator=IncrementalEvaluator(board, ai_piece),
+            threats=ThreatAnalyzer(),
+            full_window=full_window
+        )
+        iterative_deepening(board, math.inf, ai_piece, player_piece, depth, context)
+        counts[name] = context.stats.nodes
+    counts["saved"] = counts["full_window"] - counts["pvs"]
+    counts["null_window_searches"] = context.stats.null_window_searches
+    counts["re_searches"] = context.stats.re_searches
+    counts["aspiration_fails"] = context.stats.aspiration_fails
+    return counts
+
+
+def measure_positions(positions: list[str], depth: int, measure, **header) -> dict:
+    """Runs measure(board, depth, piece, opponent) in each named position, for the player to move.
+
+    measure returns a list of results; each is reported with the position's name and moves and
+    the depth. header adds fields to the report.
+    """
+    results = []
+    for name, moves in POSITIONS.items():
+        if name not in positions:
+            continue
+        board = Board.from_moves(moves)
+        piece = board.next_piece()
+        opponent = "X" if piece == "O" else "O"
+        for result in measure(board, depth, piece, opponent):
+            results.append({"name": name, "position": moves, "depth": depth, **result})
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **header,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def parallel_speedup(positions: list[str], depth: int = PARALLEL_DEPTH, core_counts: list[int] | None = None) -> dict:
+    """Times the parallel search against the serial search in each named position."""
+    from parallel import benchmark_speedup
+
+    def measure(board, depth, piece, opponent):
+        return benchmark_speedup(board, depth, piece, opponent, core_counts)
+
+    return measure_positions(positions, depth, measure, cpus=os.cpu_count())
+
+
+def move_ordering(positions: list[str], depth: int = ORDERING_DEPTH) -> dict:
+    """Counts the nodes searched with and without move ordering in each named position."""
+    return measure_positions(positions, depth, lambda *args: [compare_move_ordering(*args)])
+
+
+def search_windows(positions: list[str], depth: int = WINDOWS_DEPTH) -> dict:
+    """Counts the nodes searched with and without narrow windows in each named position."""
+    return measure_positions(positions, depth, lambda *args: [compare_search_windows(*args)])
+
+
+def run(
+    positions: list[str],
+    difficulties: list[str],
+    repeat: int = 1,
+    geometries: list[str] = ("6x7",)
+) -> dict:
+    """Runs every named position that a geometry has at every difficulty."""
+    results = []
+    for geometry in geometries:
+        for name, moves in GEOMETRY_POSITIONS[geometry].items():
+            if name not in positions:
+                continue
+            for difficulty in difficulties:
+                result = run_case(moves, difficulty, repeat, geometry)
+                result["name"] = name
+                results.append(result)
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the computer player without a window.")
+    parser.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=list(AIPlayer.DIFFICULTY_DEPTHS))
+    parser.add_argument("--positions", nargs="+", default=list(POSITIONS), choices=list(POSITIONS))
+    parser.add_argument("--geometries", nargs="+", default=["6x7"], choices=list(GEOMETRIES),
+                        help="Board sizes; sizes other than 6x7 only have the empty and opening positions.")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per case; the fastest is reported.")
+    parser.add_argument("--output", help="Write the JSON here instead of to stdout.")
+    parser.add_argument("--imports", action="store_true",
+                        help="Time importing the engine modules instead of searching.")
+    parser.add_argument("--parallel", action="store_true",
+                        help="Time the parallel search against the serial search instead.")
+    parser.add_argument("--ordering", action="store_true",
+                        help="Count the nodes searched with and without move ordering instead.")
+    parser.add_argument("--windows", action="store_true",
+                        help="Count the nodes searched with and without PVS and aspiration windows instead.")
+    parser.add_argument("--depth", type=int,
+                        help=f"Search depth for --parallel, --ordering and --windows. Defaults to "
+                             f"{PARALLEL_DEPTH}, {ORDERING_DEPTH} and {WINDOWS_DEPTH}.")
+    parser.add_argument("--cores", type=int, nargs="+",
+                        help="Worker counts for --parallel. Defaults to 1, 2, 4 and every core.")
+    args = parser.parse_args(argv)
+
+    if args.imports:
+        report = {"imports": [import_time(module) for module in ENGINE_MODULES]}
+    elif args.parallel:
+        report = parallel_speedup(args.positions, args.depth or PARALLEL_DEPTH, args.cores)
+    elif args.ordering:
+        report = move_ordering(args.positions, args.depth or ORDERING_DEPTH)
+    elif args.windows:
+        report = search_windows(args.positions, args.depth or WINDOWS_DEPTH)
+    else:
+        report = run(args.positions, args.difficulties, args.repeat, args.geometries)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        sys.stdout.write(text + "\n")
+    if args.imports and not all(result["ok"] for result in report["imports"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,84 +1,271 @@
+import functools
+import random
+
+
+def _zobrist_keys(rows: int, columns: int, seed: int = 4) -> dict[str, list[int]]:
+    """Random 64-bit key for every piece on every cell, indexed by bit position."""
+    rng = random.Random(seed)
+    cells = columns * (rows + 1)
+    return {piece: [rng.getrandbits(64) for _ in range(cells)] for piece in ("X", "O")}
+
+
+class Geometry:
+    """
+    Size of a board and the tables derived from it. The tables are built once per size and
+    shared by every board of that size; use Geometry.get() rather than the constructor.
+    The Zobrist keys and the windows are only built when first used.
+
+    Attributes:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        connect (int): Pieces in a row needed to win.
+        height (int): Bits per column, including the spare bit on top.
+        cells (int): Number of cells on the board.
+        zobrist (dict[str, List[int]]): Zobrist key of every piece on every bit position.
+        bottom_mask (int): The bottom cell of every column.
+        board_mask (int): Every cell of the board.
+        column_masks (List[int]): Every cell of each column.
+        windows (List[tuple[int, ...]]): Bit positions of every line of connect cells.
+        cell_windows (dict[int, List[int]]): Indices into windows of the lines through each cell.
+        center_columns (tuple[int, ...]): Columns whose pieces the heuristic rewards: the middle
+            column, or both middle columns when there is an even number of columns.
+        win_shifts (List[tuple[int, ...]]): Shifts that find connect in a row, per direction.
+    """
+
+    def __init__(self, rows: int, columns: int, connect: int):
+        if connect < 2 or connect > max(rows, columns):
+            raise ValueError(f"Cannot connect {connect} on a {rows}x{columns} board.")
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.height = rows + 1
+        self.cells = rows * columns
+
+        self.bottom_mask = sum(1 << (col * self.height) for col in range(columns))
+        self.board_mask = self.bottom_mask * ((1 << rows) - 1)
+        self.column_masks = [((1 << rows) - 1) << (col * self.height) for col in range(columns)]
+        # Rewarding both middle columns of an even width keeps the heuristic mirror-symmetric
+        self.center_columns = tuple(range((columns - 1) // 2, columns // 2 + 1))
+
+        # Shifts that test for connect in a row in each direction: each one doubles the run
+        # length found so far, or extends it as far as connect
+        self.win_shifts = []
+        for direction in (1, self.height, self.height + 1, self.height - 1):
+            shifts, length = [], 1
+            while length < connect:
+                step = min(length, connect - length)
+                shifts.append(step * direction)
+                length += step
+            self.win_shifts.append(tuple(shifts))
+
+    @functools.cached_property
+    def zobrist(self) -> dict[str, list[int]]:
+        return _zobrist_keys(self.rows, self.columns)
+
+    @functools.cached_property
+    def windows(self) -> list[tuple[int, ...]]:
+        windows = []
+        for col in range(self.columns):
+            for level in range(self.rows):
+                for dc, dl in ((1, 0), (0, 1), (1, 1), (1, -1)):
+                    end_col, end_level = col + (self.connect - 1) * dc, level + (self.connect - 1) * dl
+                    if 0 <= end_col < self.columns and 0 <= end_level < self.rows:
+                        windows.append(tuple(
+                            (col + i * dc) * self.height + level + i * dl for i in range(self.connect)))
+        return windows
+
+    @functools.cached_property
+    def cell_windows(self) -> dict[int, list[int]]:
+        cell_windows = {}
+        for index, window in enumerate(self.windows):
+            for bit in window:
+                cell_windows.setdefault(bit, []).append(index)
+        return cell_windows
+
+    @staticmethod
+    def get(rows: int = 6, columns: int = 7, connect: int = 4) -> "Geometry":
+        return _geometry(rows, columns, connect)
+
+    def mirror_mask(self, mask:int) -> int:
+        column_bits = (1 << self.height) - 1
+        mirrored = 0
+        for col in range(self.columns):
+            mirrored |= (mask >> (col * self.height) & column_bits) << ((self.columns - 1 - col) * self.height)
+        return mirrored
+
+    def __reduce__(self):
+        # Unpickle to the cached instance rather than a copy of the tables
+        return Geometry.get, (self.rows, self.columns, self.connect)
+
+
+@functools.cache
+def _geometry(rows: int, columns: int, connect: int) -> Geometry:
+    return Geometry(rows, columns, connect)
+
+
 class Board:
     """
     Handles game board and display logic.
 
+    The position is stored as bitboards: one mask per piece plus the height of each column.
+    Each column takes up rows + 1 bits, bottom row first. The spare bit on top of every
+    column keeps the shifted connect-N tests from wrapping into the next column.
+
     Attributes:
-        grid (List[List[str]]): The game board.
+        geometry (Geometry): Size of the board and its precomputed tables.
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        connect (int): Pieces in a row needed to win.
+        height (int): Bits per column, including the spare bit on top.
+        bitboards (dict[str, int]): Occupied cells for each piece.
+        heights (List[int]): Number of pieces in each column.
+        moves (List[tuple[int, str]]): Moves played so far, most recent last.
+        hash (int): Zobrist hash of the position, updated as moves are played and undone.
+        mirror_hash (int): Zobrist hash of the left-right mirror image of the position.
+        grid (List[List[str]]): Read-only view of the board, top row first.
 
     Methods:
+        from_moves(): Builds a board from a string of moves.
+        next_piece(): Returns the piece to play next.
         print_board(): Prints the current grid state.
         is_valid_move(): Returns True if a column is in bounds and not full.
         get_next_open_row(): Finds the next open level in a given column.
         drop_piece(): Places a piece on the grid.
+        play(): Drops a piece into a column in O(1).
+        undo(): Takes back the last move played in O(1).
         winning_move(): Returns True if a move wins the game.
+        mirror_column(): Returns the column a column maps to in the mirror image.
+        is_symmetric(): Returns True if the position is its own mirror image.
         is_full(): Returns True if the grid is completely full.
     """
+    # Size of the standard board
     ROWS = 6
     COLUMNS = 7
+    CONNECT = 4
+    PIECES = ("X", "O")
+    # Largest number of rows or columns a move string can be played on: moves are single
+    # digits, so no more than ten columns can be played anyway
+    MAX_SIZE = 10
+    # Boards created so far, copies included, so a search can report how many it allocated
+    created = 0
+
+    def __init__(self, rows: int = ROWS, columns: int = COLUMNS, connect: int = CONNECT):
+        Board.created += 1
+        self.geometry = Geometry.get(rows, columns, connect)
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.height = rows + 1
+        self.zobrist = self.geometry.zobrist
+        self.bitboards = {piece: 0 for piece in Board.PIECES}
+        self.heights = [0] * columns
+        self.moves = []
+        self.hash = 0
+        self.mirror_hash = 0
+
+    @classmethod
+    def from_moves(
+        cls,
+        moves: str,
+        first_piece: str = "X",
+        rows: int = ROWS,
+        columns: int = COLUMNS,
+        connect: int = CONNECT
+    ) -> "Board":
+        """Builds a board from a string of column digits, e.g. "3324", played alternately."""
+        board = cls(rows, columns, connect)
+        pieces = (first_piece, "X" if first_piece == "O" else "O")
+        for i, col in enumerate(moves):
+            if not board.is_valid_move(int(col)):
+                raise ValueError(f"Illegal move {col} at position {i} of {moves!r}.")
+            board.play(int(col), pieces[i % 2])
+        return board
 
-    def __init__(self):
-        self.grid = [[" " for _ in range(Board.COLUMNS)] for _ in range(Board.ROWS)]
+    def next_piece(self, first_piece: str = "X") -> str:
+        """The piece to play next, assuming the pieces have alternated from first_piece."""
+        second_piece = "X" if first_piece == "O" else "O"
+        return first_piece if len(self.moves) % 2 == 0 else second_piece
+
+    @property
+    def grid(self) -> list[list[str]]:
+        grid = [[" " for _ in range(self.columns)] for _ in range(self.rows)]
+        for piece, mask in self.bitboards.items():
+            for col in range(self.columns):
+                for level in range(self.heights[col]):
+                    if mask >> (col * self.height + level) & 1:
+                        grid[self.rows - 1 - level][col] = piece
+        return grid
 
     def print_board(self) -> None:
         for row in self.grid:
             print("|" + "|".join(row) + "|")
-        print(" " + " ".join(str(i) for i in range(Board.COLUMNS)))
+        print(" " + " ".join(str(i) for i in range(self.columns)))
         print()
 
     def is_valid_move(self, col:int) -> bool:
-        if col < 0 or col >= Board.COLUMNS:
+        if col < 0 or col >= self.columns:
             return False
-        return self.grid[0][col] == " "
+        return self.heights[col] < self.rows
 
     def get_next_open_row(self, col) -> int | None:
-        for row in reversed(range(Board.ROWS)):
-            if self.grid[row][col] == " ":
-                return row
-        return None
+        if self.heights[col] >= self.rows:
+            return None
+        return self.rows - 1 - self.heights[col]
 
     def drop_piece(self, row:int, col:int, piece: str) -> None:
-        self.grid[row][col] = piece
+        if row != self.get_next_open_row(col):
+            raise ValueError(f"Row {row} is not the next open row of column {col}.")
+        self.play(col, piece)
+
+    def play(self, col:int, piece:str) -> None:
+        bit = col * self.height + self.heights[col]
+        keys = self.zobrist[piece]
+        self.bitboards[piece] |= 1 << bit
+        self.hash ^= keys[bit]
+        self.mirror_hash ^= keys[(self.columns - 1 - col) * self.height + self.heights[col]]
+        self.heights[col] += 1
+        self.moves.append((col, piece))
+
+    def undo(self) -> None:
+        col, piece = self.moves.pop()
+        self.heights[col] -= 1
+        bit = col * self.height + self.heights[col]
+        keys = self.zobrist[piece]
+        self.bitboards[piece] ^= 1 << bit
+        self.hash ^= keys[bit]
+        self.mirror_hash ^= keys[(self.columns - 1 - col) * self.height + self.heights[col]]
 
     def winning_move(self, piece:str) -> bool:
-        # Horizontal
-        for c in range(Board.COLUMNS-3):
-            for r in range(Board.ROWS):
-                if self.grid[r][c] == piece and \
-                    self.grid[r][c+1] == piece and \
-                    self.grid[r][c+2] == piece and \
-                    self.grid[r][c+3] == piece:
-                    return True
-        # Vertical
-        for c in range(Board.COLUMNS):
-            for r in range(Board.ROWS-3):
-                if self.grid[r][c] == piece and \
-                    self.grid[r+1][c] == piece and \
-                    self.grid[r+2][c] == piece and \
-                    self.grid[r+3][c] == piece:
-                    return True
-
-        # Positive diagonal
-        for c in range(Board.COLUMNS-3):
-            for r in range(Board.ROWS-3):
-                if self.grid[r][c] == piece and \
-                    self.grid[r+1][c+1] == piece and \
-                    self.grid[r+2][c+2] == piece and \
-                    self.grid[r+3][c+3] == piece:
-                    return True
-        # Negative diagonal
-        for c in range(Board.COLUMNS-3):
-            for r in range(3 ,Board.ROWS):
-                if self.grid[r][c] == piece and \
-                    self.grid[r-1][c+1] == piece and \
-                    self.grid[r-2][c+2] == piece and \
-                    self.grid[r-3][c+3] == piece:
-                    return True
+        mask = self.bitboards[piece]
+        # Vertical, horizontal, positive diagonal, negative diagonal
+        for shifts in self.geometry.win_shifts:
+            run = mask
+            for shift in shifts:
+                run &= run >> shift
+            if run:
+                return True
         return False
 
+    def mirror_column(self, col:int) -> int:
+        return self.columns - 1 - col
+
+    def mirror_mask(self, mask:int) -> int:
+        return self.geometry.mirror_mask(mask)
+
+    def is_symmetric(self) -> bool:
+        # Equal hashes are almost always a true mirror image, but check the masks to be sure
+        if self.hash != self.mirror_hash:
+            return False
+        return all(self.mirror_mask(mask) == mask for mask in self.bitboards.values())
+
     def is_full(self) -> bool:
-        return all(self.grid[0][col] != " " for col in range(Board.COLUMNS))
-    
+        return len(self.moves) == self.geometry.cells
+
     def copy(self) -> object:
-        new_board = Board()
-        new_board.grid = [row[:] for row in self.grid]
-        return new_board
\ No newline at end of file
+        new_board = Board(self.rows, self.columns, self.connect)
+        new_board.bitboards = dict(self.bitboards)
+        new_board.heights = self.heights[:]
+        new_board.moves = self.moves[:]
+        new_board.hash = self.hash
+        new_board.mirror_hash = self.mirror_hash
+        return new_board
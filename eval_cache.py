@@ -0,0 +1,77 @@
+from collections import OrderedDict
+
+# Approximate memory an entry takes: the dictionary slot and linked-list node of the
+# OrderedDict plus the 64-bit key and the score objects
+ENTRY_BYTES = 168
+
+
+class EvaluationCache:
+    """
+    Bounded cache of leaf scores, keyed by Zobrist hash, that evicts the least recently used
+    entry once it is full. A position and its mirror image score the same, so they share the
+    key of minimax.position_key().
+
+    Different paths through the tree reach the same leaf, and the searches for consecutive
+    moves of a game reach many of the same leaves again. Scores are for one player with one
+    set of weights and the first move of one game, so each computer player keeps its own
+    cache and clears it between games.
+
+    Attributes:
+        max_bytes (int): Memory the cache may use, approximately.
+        capacity (int): Number of entries that fit in max_bytes.
+        hits (int): Lookups that found the position.
+        misses (int): Lookups that did not.
+        evictions (int): Entries dropped to make room for new ones.
+    """
+
+    def __init__(self, max_bytes=16 << 20):
+        self.max_bytes = max_bytes
+        self.capacity = max(1, max_bytes // ENTRY_BYTES)
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def get(self, key: int) -> float | None:
+        """The score stored for a position, or None if it is not stored."""
+        score = self.entries.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return score
+
+    def put(self, key: int, score: float) -> None:
+        self.entries[key] = score
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        self.entries.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @property
+    def memory_bytes(self) -> int:
+        """Approximate memory the entries take up."""
+        return len(self.entries) * ENTRY_BYTES
+
+    def as_dict(self) -> dict:
+        return {
+            "entries": len(self.entries),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": self.hit_rate,
+            "memory_bytes": self.memory_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,106 @@
+from board import Board
+
+
+class Weights:
+    """
+    Manual weights of the heuristic evaluation. The names are for the standard game of
+    connect four; with a different N, three means N - 1 pieces and two means N - 2.
+
+    Attributes:
+        four (int): A window filled by the player.
+        three (int): Three of the player's pieces and one empty cell.
+        two (int): Two of the player's pieces and two empty cells.
+        opponent_three (int): Three of the opponent's pieces and one empty cell.
+        center (int): Each of the player's pieces in the center column, or either middle column
+            of an even width.
+    """
+
+    def __init__(self, four=1000, three=10, two=5, opponent_three=-80, center=3):
+        self.four = four
+        self.three = three
+        self.two = two
+        self.opponent_three = opponent_three
+        self.center = center
+
+    def window_score(self, own: int, opponent: int, size: int = 4) -> int:
+        """Score of a window of size cells holding the given number of pieces of each player."""
+        empty = size - own - opponent
+        score = 0
+        if own == size:
+            score += self.four
+        elif own == size - 1 and empty == 1:
+            score += self.three
+        elif own == size - 2 and empty == 2:
+            score += self.two
+
+        if opponent == size - 1 and empty == 1:
+            score += self.opponent_three
+        return score
+
+
+DEFAULT_WEIGHTS = Weights()
+
+
+def window_table(weights: Weights, size: int) -> list[list[int]]:
+    """Score of a window indexed by [own][opponent] pieces."""
+    return [[weights.window_score(own, opponent, size) if own + opponent <= size else 0
+             for opponent in range(size + 1)] for own in range(size + 1)]
+
+
+class IncrementalEvaluator:
+    """
+    Keeps the heuristic score of a board up to date as moves are played and undone.
+
+    Rather than rescanning the board, it stores how many pieces each player has in each
+    window of connect cells and updates only the windows through the cell that changed. The score
+    always equals minimax.score_position() for the same board and weights.
+
+    Attributes:
+        geometry (Geometry): Size of the boards the evaluator scores.
+        piece (str): The player the score is calculated for.
+        weights (Weights): Weights of the heuristic.
+        own (List[int]): Number of the player's pieces in each window.
+        opponent (List[int]): Number of opponent pieces in each window.
+        score (int): Current heuristic score.
+    """
+
+    def __init__(self, board: Board, piece: str, weights: Weights | None = None):
+        self.geometry = board.geometry
+        self.piece = piece
+        self.weights = weights if weights is not None else DEFAULT_WEIGHTS
+        self.table = window_table(self.weights, board.connect)
+        windows = len(self.geometry.windows)
+        self.own = [0] * windows
+        self.opponent = [0] * windows
+        self.score = self.table[0][0] * windows
+        self._load(board)
+
+    def _load(self, board: Board) -> None:
+        for piece, mask in board.bitboards.items():
+            for bit in self.geometry.cell_windows:
+                if mask >> bit & 1:
+                    self._update(bit, piece, 1)
+
+    def _update(self, bit: int, piece: str, delta: int) -> None:
+        table = self.table
+        counts = self.own if piece == self.piece else self.opponent
+        own, opponent = self.own, self.opponent
+        score = self.score
+        geometry = self.geometry
+        for index in geometry.cell_windows[bit]:
+            score -= table[own[index]][opponent[index]]
+            counts[index] += delta
+            score += table[own[index]][opponent[index]]
+        if piece == self.piece and bit // geometry.height in geometry.center_columns:
+            score += delta * self.weights.center
+        self.score = score
+
+    def push(self, board: Board) -> None:
+        """Account for the move just played on the board."""
+        col, piece = board.moves[-1]
+        self._update(col * board.height + board.heights[col] - 1, piece, 1)
+
+    def pop(self, board: Board) -> None:
+        """Remove the last move on the board from the score. Call before Board.undo()."""
+        col, piece = board.moves[-1]
+        self._update(col * board.height + board.heights[col] - 1, piece, -1)
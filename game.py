@@ -1,8 +1,13 @@
 import random
 import pygame
 import sys
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from board import Board
+from minimax import SearchCancelled
+from record import GameRecord, ai_move_stats
+from text_cache import render_text
 
 class Game:
     """
@@ -10,10 +15,13 @@ class Game:
 
     Attributes:
         board: The game board.
+        square_size: Width of a board cell in pixels, chosen so the board fits the window.
         players: The players, human or AI. Limited to 2.
         turn: Determines which player's turn it is.
         game_over: True if the game is over, either from a win or a draw.
         winner: Name of the winner.
+        record: Record of the game in progress, appended to record_path when it ends.
+        record_path: JSON Lines file every game is logged to, or None to keep no log.
     """
 
     # Constants for the game
@@ -26,19 +34,31 @@ class Game:
     EMPTY_COLOR = (240, 235, 230) # Off-white
     PLAYER1_COLOR = (255, 0, 0)  # Red
     PLAYER2_COLOR = (0, 0, 0)  # Black
-    SQUARE_SIZE = 100
-    RADIUS = int(SQUARE_SIZE/2 - 5)
-    
+    MAX_SQUARE_SIZE = 100
+
     # Board position
     BOARD_OFFSET_X = 0
-    BOARD_OFFSET_Y = SQUARE_SIZE  # Leave space at top for piece dropping animation
 
-    def __init__(self, player1: object, player2: object):
-        self.board = Board()
+    def __init__(
+        self,
+        player1: object,
+        player2: object,
+        rows: int = Board.ROWS,
+        columns: int = Board.COLUMNS,
+        connect: int = Board.CONNECT,
+        record_path: str | None = "games.jsonl"
+    ):
+        self.board = Board(rows, columns, connect)
+        # Leave a row of space at the top for the piece dropping animation
+        self.square_size = min(Game.MAX_SQUARE_SIZE, Game.WINDOW_WIDTH // columns, Game.WINDOW_HEIGHT // (rows + 1))
+        self.radius = int(self.square_size / 2 - 5)
+        self.board_offset_y = self.square_size
         self.players = [player1, player2]
         self.turn = random.randint(0, 1)
         self.game_over = False
         self.winner = None
+        self.record_path = record_path
+        self.record = self.new_record()
         
         # Store the piece colors
         self.piece_colors = {
@@ -57,9 +77,23 @@ class Game:
         self.last_frame_time = 0
         self.anim_speed_per_sec = 900  # Pixels per second
         
+        # Rendering: the window with the board and landed pieces is drawn once to background.
+        # Each frame only the moving piece, the hover piece and the banner are drawn over it.
+        self.background = None
+        self.dirty_rects = []
+        self.drawn_items = None
+        self.drawn_rects = []
+
         # AI processing variables
         self.pending_ai_move = False
         self.ai_move_column = None
+        self.ai_move_stats = None
+
+        # The AI searches on a worker thread so the window keeps handling events. A thread
+        # rather than a process lets the search keep using the player's transposition table.
+        self.ai_executor = ThreadPoolExecutor(max_workers=1)
+        self.ai_search = None
+        self.ai_stop = None
 
     def run(self):
         """Start the game."""
@@ -83,8 +117,7 @@ class Game:
         """Handle player input."""
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit()
                 
             if event.type == pygame.MOUSEBUTTONDOWN and not self.game_over:
                 # Only handle mouse events for human player when not animating
@@ -95,8 +128,7 @@ class Game:
                 if event.key == pygame.K_r and not self.animating:  # Reset game with 'r' key
                     self.reset_game()
                 if event.key == pygame.K_q or event.key == pygame.K_ESCAPE:  # Quit with 'q' or ESC
-                    pygame.quit()
-                    sys.exit()
+                    self.quit()
 
     def update(self):
         """Update game logic."""
@@ -111,14 +143,27 @@ class Game:
             self.pending_ai_move = False
             return
             
+        # Collect the AI's move once the background search has finished
+        if self.ai_search is not None:
+            if self.ai_search.done():
+                # Instead of immediately making the move, schedule it
+                self.ai_move_column = self.ai_search.result()
+                self.ai_move_stats = ai_move_stats(self.players[self.turn])
+                self.pending_ai_move = True
+                self.ai_search = None
+            return
+
         # Check if it's AI's turn and no animation is in progress
         if not self.game_over and not self.animating:
             if self.players[self.turn].__class__.__name__ == "AIPlayer":
-                col = self.players[self.turn].get_move(self.board)
-                
-                # Instead of immediately making the move, schedule it
-                self.ai_move_column = col
-                self.pending_ai_move = True
+                self.ai_stop = threading.Event()
+                self.ai_search = self.ai_executor.submit(
+                    self.players[self.turn].get_move, self.board.copy(), self.ai_stop)
+            else:
+                # Let a pondering AI think about its answers during the human's turn
+                opponent = self.players[(self.turn + 1) % 2]
+                if opponent.__class__.__name__ == "AIPlayer" and opponent.ponder:
+                    opponent.start_pondering(self.board)
 
     def update_animation(self):
         """Update the animation with delta time for smooth motion regardless of frame rate."""
@@ -132,90 +177,117 @@ class Game:
             self.animating = False
             
             self.board.drop_piece(self.anim_row, self.anim_col, self.anim_piece)
+            self.dirty_rects.append(self.draw_disc(self.anim_row, self.anim_col, self.anim_piece))
             
             if self.board.winning_move(self.anim_piece):
                 self.game_over = True
                 self.winner = self.players[self.turn].name
+                self.save_record(self.anim_piece)
             elif self.board.is_full():
                 self.game_over = True
                 self.winner = "draw"
+                self.save_record("draw")
             else:
                 self.turn = (self.turn + 1) % 2
+            if self.game_over:
+                # Pondering the finished game would keep a core busy on the game-over screen
+                self.cancel_ai_search()
 
     def draw(self):
-        """Draw elements to screen."""
-        self.screen.fill((Game.EMPTY_COLOR)) # Clear screen
-        self.draw_board()
-        
+        """Draw the parts of the screen that changed since the last frame."""
+        if self.background is None:
+            self.draw_board()
+            self.dirty_rects = [self.screen.get_rect()]
+            self.drawn_items = None
+
+        # Everything drawn over the background, with what decides how each one looks
+        items = []
+        if self.animating:
+            items.append(("piece", self.anim_col, int(self.anim_y), self.anim_piece))
         # Draw current player's piece at mouse position if it's player's turn and game is not over
         if not self.game_over and not self.animating and self.players[self.turn].__class__.__name__ == "Player":
-            self.draw_hover_piece()
-        
+            items.append(("hover", pygame.mouse.get_pos()[0], self.players[self.turn].piece))
         if self.game_over:
-            self.draw_game_over_message()
-            
-        pygame.display.update()
+            items.append(("banner", self.winner))
+        if items == self.drawn_items and not self.dirty_rects:
+            return
+
+        # Erase last frame's items and bring in changes to the background, then draw this frame's items
+        erased = self.dirty_rects + self.drawn_rects
+        for rect in erased:
+            self.screen.blit(self.background, rect, rect)
+        self.drawn_rects = []
+        for item in items:
+            if item[0] == "piece":
+                self.drawn_rects.append(self.draw_animated_piece())
+            elif item[0] == "hover":
+                self.drawn_rects.append(self.draw_hover_piece())
+            else:
+                self.drawn_rects.extend(self.draw_game_over_message())
+        self.drawn_items = items
+        self.dirty_rects = []
+
+        pygame.display.update(erased + self.drawn_rects)
 
     def draw_board(self):
-        """Draws game board to screen."""
-        board_width = Game.SQUARE_SIZE * Board.COLUMNS
-        board_height = Game.SQUARE_SIZE * Board.ROWS
+        """Draws the game board and the pieces on it to the cached background."""
+        self.background = pygame.Surface((Game.WINDOW_WIDTH, Game.WINDOW_HEIGHT)).convert()
+        self.background.fill(Game.EMPTY_COLOR)
+        board_width = self.square_size * self.board.columns
+        board_height = self.square_size * self.board.rows
 
         pygame.draw.rect(
-            self.screen, 
+            self.background,
             Game.BOARD_OUTLINE_COLOR,
-            (Game.BOARD_OFFSET_X - 5, Game.BOARD_OFFSET_Y - 5, board_width + 10, board_height + 10),
+            (Game.BOARD_OFFSET_X - 5, self.board_offset_y - 5, board_width + 10, board_height + 10),
             border_radius=10
         )
-        
+
         pygame.draw.rect(
-            self.screen, 
-            Game.BOARD_COLOR, 
-            (Game.BOARD_OFFSET_X, Game.BOARD_OFFSET_Y, board_width, board_height),
+            self.background,
+            Game.BOARD_COLOR,
+            (Game.BOARD_OFFSET_X, self.board_offset_y, board_width, board_height),
             border_radius=8
         )
-        
+
         # Draw the grid and pieces
-        for row in range(Board.ROWS):
-            for col in range(Board.COLUMNS):
-                # Calculate position for this grid cell
-                x = col * Game.SQUARE_SIZE + Game.SQUARE_SIZE // 2 + Game.BOARD_OFFSET_X
-                y = row * Game.SQUARE_SIZE + Game.SQUARE_SIZE // 2 + Game.BOARD_OFFSET_Y
-                
-                # Draw the empty circle
-                pygame.draw.circle(
-                    self.screen,
-                    self.piece_colors[self.board.grid[row][col]],
-                    (x, y),
-                    Game.RADIUS
-                )
-
-        # Draw the animated piece
-        if self.animating:
-            x = self.anim_col * Game.SQUARE_SIZE + Game.SQUARE_SIZE // 2 + Game.BOARD_OFFSET_X
-            pygame.draw.circle(
-                self.screen,
-                self.piece_colors[self.anim_piece],
-                (x, self.anim_y),
-                Game.RADIUS
-            )
+        grid = self.board.grid
+        for row in range(self.board.rows):
+            for col in range(self.board.columns):
+                self.draw_disc(row, col, grid[row][col])
+
+    def draw_disc(self, row, col, piece):
+        """Draws one cell of the board to the background. Returns the area drawn."""
+        x = col * self.square_size + self.square_size // 2 + Game.BOARD_OFFSET_X
+        y = row * self.square_size + self.square_size // 2 + self.board_offset_y
+        return pygame.draw.circle(self.background, self.piece_colors[piece], (x, y), self.radius)
+
+    def draw_animated_piece(self):
+        """Draw the falling piece. Returns the area drawn."""
+        x = self.anim_col * self.square_size + self.square_size // 2 + Game.BOARD_OFFSET_X
+        return pygame.draw.circle(
+            self.screen,
+            self.piece_colors[self.anim_piece],
+            (x, self.anim_y),
+            self.radius
+        )
 
     def draw_hover_piece(self):
-        """Draw the piece at the mouse x-position when it's the player's turn"""
+        """Draw the piece at the mouse x-position when it's the player's turn. Returns the area drawn."""
         x = pygame.mouse.get_pos()[0]
         color = self.piece_colors[self.players[self.turn].piece]
-        pygame.draw.circle(self.screen, color, (x, Game.SQUARE_SIZE // 2), Game.RADIUS)
+        return pygame.draw.circle(self.screen, color, (x, self.square_size // 2), self.radius)
 
     def draw_game_over_message(self):
-        """Draw a banner for any given end-game state."""
+        """Draw a banner for any given end-game state. Returns the areas drawn."""
         text = None
         if self.winner == "draw":
             text = "It's a draw!"
         else:
             text = f"{self.winner} wins!"
         
-        text_surface = self.font.render(text, True, (255, 255, 255))
-        text_rect = text_surface.get_rect(center=(Game.WINDOW_WIDTH // 2, Game.SQUARE_SIZE // 2))
+        text_surface = render_text(self.font, text, (255, 255, 255))
+        text_rect = text_surface.get_rect(center=(Game.WINDOW_WIDTH // 2, self.square_size // 2))
         
         bg_rect = text_rect.copy()
         bg_rect.inflate_ip(20, 10)
@@ -225,16 +297,17 @@ class Game:
         self.screen.blit(text_surface, text_rect)
         
         # Add restart instructions
-        restart_text = self.font.render("Press 'R' to restart", True, (145, 145, 145))
+        restart_text = render_text(self.font, "Press 'R' to restart", (145, 145, 145))
         restart_rect = restart_text.get_rect(center=(Game.WINDOW_WIDTH // 2, text_rect.bottom + 100))
         self.screen.blit(restart_text, restart_rect)
+        return [bg_rect, restart_rect]
 
     def handle_player_move(self, mouse_x):
         """Determine which column the player is selecting and make the move."""
         # Convert mouse x position to column
-        col = int(mouse_x // Game.SQUARE_SIZE)
+        col = int(mouse_x // self.square_size)
         
-        if 0 <= col < Board.COLUMNS and self.board.is_valid_move(col):
+        if 0 <= col < self.board.columns and self.board.is_valid_move(col):
             self.make_move(col)
 
     def make_move(self, col):
@@ -246,14 +319,77 @@ class Game:
             self.anim_piece = self.players[self.turn].piece
             self.anim_col = col
             self.anim_row = row
-            self.anim_y = Game.SQUARE_SIZE // 2  # Start at the top
-            self.anim_target_y = row * Game.SQUARE_SIZE + Game.SQUARE_SIZE // 2 + Game.BOARD_OFFSET_Y
+            self.anim_y = self.square_size // 2  # Start at the top
+            self.anim_target_y = row * self.square_size + self.square_size // 2 + self.board_offset_y
+            self.record.add_move(col, self.ai_move_stats)
+            self.ai_move_stats = None
+
+    def new_record(self):
+        """Start the record of a new game, with the player whose turn it is moving first."""
+        return GameRecord(
+            self.board.rows,
+            self.board.columns,
+            self.board.connect,
+            players={player.piece: player.name for player in self.players},
+            first=self.players[self.turn].piece
+        )
+
+    def save_record(self, result=None):
+        """Log the game's record, with its result or None if it was left unfinished.
+
+        Does nothing if the record was already saved or no moves were made.
+        """
+        if self.record is None or not self.record.moves:
+            return
+        self.record.result = result
+        if self.record_path is not None:
+            self.record.write(self.record_path)
+        self.record = None
+
+    def cancel_ai_search(self, wait=False):
+        """Stop the AI search in flight and any pondering, and discard their results.
+
+        If wait is True, also wait for the search to stop. It only notices the cancellation
+        at its next check, and until then it keeps writing to the player's caches.
+        """
+        if self.ai_stop is not None:
+            self.ai_stop.set()
+        if wait and self.ai_search is not None:
+            try:
+                self.ai_search.result()
+            except SearchCancelled:
+                pass
+        self.ai_search = None
+        self.ai_stop = None
+        for player in self.players:
+            if player.__class__.__name__ == "AIPlayer":
+                player.stop_pondering()
+
+    def quit(self):
+        """Cancel any background search and close the game."""
+        self.cancel_ai_search()
+        self.save_record()
+        self.ai_executor.shutdown(wait=False)
+        for player in self.players:
+            if player.__class__.__name__ == "AIPlayer":
+                player.shutdown()
+        pygame.quit()
+        sys.exit()
 
     def reset_game(self):
         """Resets the game."""
-        self.board = Board()
+        # The cancelled search must not write the old game's positions into the caches cleared below
+        self.cancel_ai_search(wait=True)
+        self.save_record()
+        for player in self.players:
+            if player.__class__.__name__ == "AIPlayer":
+                player.reset()
+        self.board = Board(self.board.rows, self.board.columns, self.board.connect)
         self.turn = random.randint(0, 1)
         self.game_over = False
         self.winner = None
+        self.record = self.new_record()
         self.animating = False
-        self.pending_ai_move = False
\ No newline at end of file
+        self.background = None
+        self.pending_ai_move = False
+        self.ai_move_stats = None
\ No newline at end of file
@@ -1,10 +1,12 @@
-import pygame
-from game import Game
-from menu import Menu
 from player import Player
 from ai import AIPlayer
 
 def main():
+    # The window is only opened here, so importing the engine does not load pygame
+    import pygame
+    from game import Game
+    from menu import Menu
+
     pygame.init()
     pygame.display.set_caption('Connect 4')
     menu = Menu()
@@ -13,7 +15,7 @@ def main():
     if game_mode == 'pvp':
         game = Game(Player("X", "Player 1"), Player("O", "Player 2"))
     else:
-        game = Game(Player("X", "Player"), AIPlayer("O", ai_difficulty))
+        game = Game(Player("X", "Player"), AIPlayer("O", ai_difficulty, ponder=True))
 
     game.run()
 
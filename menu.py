@@ -1,5 +1,6 @@
 import pygame
 import sys
+from text_cache import render_text
 
 class Menu:
     """
@@ -13,17 +14,21 @@ class Menu:
         button_text_color: Button text color.
         title_font: Font of the title text.
         button_font: Font of the button text.
-        small_font: 
-        buttons: List of all menu buttons.
+        small_font: Font of the difficulty button text, small enough to fit the narrower buttons.
+        buttons: List of all menu buttons, each pre-rendered in its normal, hover and selected states.
+        background: The menu without its buttons, rendered once.
+        note_y: Height of the line under the difficulty buttons that explains the solver difficulty.
         game_mode: Determines if player is versing another player or a computer.
         ai_difficulty: If versing a computer, determines the computer's difficulty.
     """
 
+    FPS = 60
     WINDOW_WIDTH = 700
     WINDOW_HEIGHT = 700
     
     def __init__(self):
         self.screen = pygame.display.set_mode((Menu.WINDOW_WIDTH, Menu.WINDOW_HEIGHT))
+        self.clock = pygame.time.Clock()
         
         # Colors
         self.bg_color = (255, 200, 0)  # Yellow
@@ -36,10 +41,13 @@ class Menu:
         # Fonts
         self.title_font = pygame.font.SysFont('Arial', 60, bold=True)
         self.button_font = pygame.font.SysFont('Arial', 32)
+        self.small_font = pygame.font.SysFont('Arial', 20)
         
         # Buttons
         self.buttons = []
         self.create_buttons()
+        self.render_buttons()
+        self.background = None
         
         # Game options
         self.game_mode = "pvc"
@@ -72,7 +80,7 @@ class Menu:
         
         # AI Difficulty buttons
         y_position += button_height + button_spacing + 20
-        difficulties = ["easy", "medium", "hard", "very hard"]
+        difficulties = ["easy", "medium", "hard", "very hard", "solver"]
         small_button_width = (button_width - (len(difficulties) - 1) * button_spacing) // len(difficulties)
         
         for i, difficulty in enumerate(difficulties):
@@ -80,10 +88,14 @@ class Menu:
             self.buttons.append({
                 'rect': pygame.Rect(x_position, y_position, small_button_width, button_height),
                 'text': difficulty.capitalize(),
+                'font': self.small_font,
                 'action': f'difficulty_{difficulty}',
                 'difficulty': difficulty
             })
         
+        # The solver difficulty is explained in the gap below the difficulty buttons
+        self.note_y = y_position + button_height + (button_spacing + 30) // 2
+
         # Start game button
         y_position += button_height + button_spacing + 30
         self.buttons.append({
@@ -100,6 +112,36 @@ class Menu:
             'action': 'quit'
         })
 
+    def render_buttons(self):
+        """Render every button once in each of its states."""
+        colors = {
+            'normal': self.button_color,
+            'hover': self.button_hover_color,
+            'selected': self.button_selected_color,
+        }
+        for button in self.buttons:
+            rect = button['rect']
+            text_surface = render_text(button.get('font', self.button_font), button['text'], self.button_text_color)
+            button['surfaces'] = {}
+            for state, color in colors.items():
+                surface = pygame.Surface(rect.size).convert()
+                surface.fill(color)
+                pygame.draw.rect(surface, self.text_color, surface.get_rect(), 2)  # Button border
+                surface.blit(text_surface, text_surface.get_rect(center=surface.get_rect().center))
+                button['surfaces'][state] = surface
+            button['drawn_state'] = None
+
+    def button_state(self, button, mouse_pos):
+        """Which of its pre-rendered states a button is shown in."""
+        if (button['action'] == 'pvp' and self.game_mode == 'pvp') or \
+           (button['action'] == 'pvc' and self.game_mode == 'pvc') or \
+           (button['action'].startswith('difficulty_') and button['difficulty'] == self.ai_difficulty):
+            return 'selected'
+        # Highlight button on hover
+        if button['rect'].collidepoint(mouse_pos):
+            return 'hover'
+        return 'normal'
+
     def run(self):
         """Run the menu loop and return the selected options."""
         while True:
@@ -126,31 +168,37 @@ class Menu:
                                 elif button['action'] == 'quit':
                                     pygame.quit()
                                     sys.exit()
-            self.draw(mouse_pos)
-            pygame.display.update()
+            dirty_rects = self.draw(mouse_pos)
+            if dirty_rects:
+                pygame.display.update(dirty_rects)
+            self.clock.tick(Menu.FPS)
 
     def draw(self, mouse_pos):
-        """Draw the elements to the screen."""
-        self.screen.fill(self.bg_color)
-        
-        # Draw title
-        title_surface = self.title_font.render('Connect 4', True, self.text_color)
-        title_rect = title_surface.get_rect(center=(Menu.WINDOW_WIDTH // 2, 100))
-        self.screen.blit(title_surface, title_rect)
-        
-        # Draw buttons
+        """Draw the elements that changed since the last frame. Returns the areas drawn."""
+        dirty_rects = []
+        if self.background is None:
+            self.background = pygame.Surface((Menu.WINDOW_WIDTH, Menu.WINDOW_HEIGHT)).convert()
+            self.background.fill(self.bg_color)
+
+            # Draw title
+            title_surface = render_text(self.title_font, 'Connect 4', self.text_color)
+            title_rect = title_surface.get_rect(center=(Menu.WINDOW_WIDTH // 2, 100))
+            self.background.blit(title_surface, title_rect)
+
+            # The solver is only exact when it finishes in time, which is rare early in the game
+            note_surface = render_text(self.small_font, 'Solver: exact when it solves the position in time, else Very Hard',
+                                       self.text_color)
+            self.background.blit(note_surface, note_surface.get_rect(center=(Menu.WINDOW_WIDTH // 2, self.note_y)))
+
+            self.screen.blit(self.background, (0, 0))
+            dirty_rects.append(self.screen.get_rect())
+            for button in self.buttons:
+                button['drawn_state'] = None
+
+        # Draw buttons whose state changed
         for button in self.buttons:
-            # Highlight button on hover
-            color = self.button_hover_color if button['rect'].collidepoint(mouse_pos) else self.button_color
-            
-            if (button['action'] == 'pvp' and self.game_mode == 'pvp') or \
-               (button['action'] == 'pvc' and self.game_mode == 'pvc') or \
-               (button['action'].startswith('difficulty_') and button['difficulty'] == self.ai_difficulty):
-                color = self.button_selected_color
-            
-            pygame.draw.rect(self.screen, color, button['rect'])
-            pygame.draw.rect(self.screen, self.text_color, button['rect'], 2)  # Button border
-            
-            text_surface = self.button_font.render(button['text'], True, self.button_text_color)
-            text_rect = text_surface.get_rect(center=button['rect'].center)
-            self.screen.blit(text_surface, text_rect)
\ No newline at end of file
+            state = self.button_state(button, mouse_pos)
+            if state != button['drawn_state']:
+                dirty_rects.append(self.screen.blit(button['surfaces'][state], button['rect']))
+                button['drawn_state'] = state
+        return dirty_rects
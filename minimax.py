@@ -1,70 +1,183 @@
 import math
-import random
+import time
 from board import Board
+from eval_cache import EvaluationCache
+from evaluation import DEFAULT_WEIGHTS, IncrementalEvaluator
+from ordering import MoveOrdering
+from stats import SearchStats
+from threats import WIN, ThreatAnalyzer
+from transposition import EXACT, LOWER, UPPER, MINIMIZING_KEY, TranspositionTable
 
+# Score of a won game less the number of moves played in it, so that quicker wins score
+# higher and slower losses lower. Far above any heuristic score.
+WIN_SCORE = 1_000_000
+# Half-width of the window the root is first searched with around the previous depth's score
+ASPIRATION_WINDOW = 25
 
-def evaluate_window(window, piece):
-    """Add score based on how many pieces are in a line."""
-    score = 0
-    opponent_piece = "X" if piece == "O" else "O"
+class SearchTimeout(Exception):
+    """Raised inside a search once its time budget has run out."""
 
-    if window.count(piece) == 4:
-        score += 1000
-    elif window.count(piece) == 3 and window.count(" ") == 1:
-        score += 10
-    elif window.count(piece) == 2 and window.count(" ") == 2:
-        score += 5
 
-    if window.count(opponent_piece) == 3 and window.count(" ") == 1:
-        score -= 80
+class SearchCancelled(Exception):
+    """Raised inside a search when its stop event is set."""
 
-    return score
 
-def score_position(board, piece):
+class SearchContext:
+    """
+    State shared by every node of a single search.
+
+    Attributes:
+        stats (SearchStats): Counters for the search.
+        table (TranspositionTable): Cache of searched positions, or None to search without one.
+        deadline (float): time.perf_counter() value at which the search gives up, or None.
+        stop (threading.Event): Set from another thread to cancel the search, or None.
+        pv_moves (dict[int, int]): Best move per position key from the previous iteration,
+            searched first when the position comes up again. Moves are stored in the key's
+            orientation, see orient().
+        ordering (MoveOrdering): Move ordering heuristics, or None to try columns left to right.
+        evaluator (IncrementalEvaluator): Keeps the leaf score up to date as moves are played,
+            or None to score each leaf with score_position().
+        threats (ThreatAnalyzer): Settles positions with an immediate win or an unstoppable
+            threat, narrows the moves searched and scores threats at the leaves, or None.
+        eval_cache (EvaluationCache): Scores of leaves already evaluated, checked before
+            evaluating a leaf, or None.
+        exact_depth (bool): Only take values from table entries searched to exactly the
+            depth a node needs, not deeper. The values then do not depend on what the table
+            held before the search, at the cost of fewer hits.
+        full_window (bool): Search every move with the full window, and every depth of
+            iterative_deepening() without an aspiration window. Only for measuring what the
+            narrower windows save, see bench.compare_search_windows().
+    """
+
+    def __init__(
+        self,
+        stats: SearchStats | None = None,
+        table: TranspositionTable | None = None,
+        ordering: MoveOrdering | None = None,
+        evaluator: IncrementalEvaluator | None = None,
+        stop: "threading.Event | None" = None,
+        threats: ThreatAnalyzer | None = None,
+        eval_cache: EvaluationCache | None = None,
+        exact_depth: bool = False,
+        full_window: bool = False
+    ):
+        self.stats = stats if stats is not None else SearchStats()
+        self.table = table
+        self.ordering = ordering
+        self.evaluator = evaluator
+        self.stop = stop
+        self.threats = threats
+        self.eval_cache = eval_cache
+        self.exact_depth = exact_depth
+        self.full_window = full_window
+        self.deadline = None
+        self.pv_moves = {}
+
+    def check_time(self) -> None:
+        # Reading the clock on every node is measurable, so only look every 256 nodes
+        if self.stats.nodes & 255:
+            return
+        if self.stop is not None and self.stop.is_set():
+            raise SearchCancelled()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+
+def position_key(board: Board, maximizing_player: bool) -> tuple[int, bool]:
+    """Key shared by a position and its mirror image, and whether the board is the mirrored one.
+
+    Of the two orientations, the one with the smaller Zobrist hash is used for the key.
+    """
+    mirrored = board.mirror_hash < board.hash
+    key = board.mirror_hash if mirrored else board.hash
+    if not maximizing_player:
+        key ^= MINIMIZING_KEY
+    return key, mirrored
+
+def orient(board: Board, col: int | None, mirrored: bool) -> int | None:
+    """Maps a column between the board and the orientation its key is stored in. The mapping is its own inverse."""
+    if col is None or not mirrored:
+        return col
+    return board.mirror_column(col)
+
+def evaluate_window(window, piece, weights=DEFAULT_WEIGHTS):
+    """Add score based on how many pieces are in a line."""
+    opponent_piece = "X" if piece == "O" else "O"
+    return weights.window_score(window.count(piece), window.count(opponent_piece), len(window))
+
+def score_position(board, piece, weights=DEFAULT_WEIGHTS):
     """Manual weights to help computer decide on a move."""
     score = 0
+    grid = board.grid
+    rows, columns, n = board.rows, board.columns, board.connect
 
     # Score center column - favors playing in the center
-    center_array = [row[3] for row in board.grid]
-    center_count = center_array.count(piece)
-    score += center_count * 3
+    for col in board.geometry.center_columns:
+        center_array = [row[col] for row in grid]
+        center_count = center_array.count(piece)
+        score += center_count * weights.center
 
     # Score horizontal
-    for r in range(6):
-        row_array = board.grid[r]
-        for c in range(4):
-            window = row_array[c:c+4]
-            score += evaluate_window(window, piece)
+    for r in range(rows):
+        row_array = grid[r]
+        for c in range(columns - n + 1):
+            window = row_array[c:c+n]
+            score += evaluate_window(window, piece, weights)
 
     # Score vertical
-    for c in range(7):
-        col_array = [board.grid[r][c] for r in range(6)]
-        for r in range(3):
-            window = col_array[r:r+4]
-            score += evaluate_window(window, piece)
+    for c in range(columns):
+        col_array = [grid[r][c] for r in range(rows)]
+        for r in range(rows - n + 1):
+            window = col_array[r:r+n]
+            score += evaluate_window(window, piece, weights)
 
     # Score positive diagonal
-    for r in range(3):
-        for c in range(4):
-            window = [board.grid[r+i][c+i] for i in range(4)]
-            score += evaluate_window(window, piece)
+    for r in range(rows - n + 1):
+        for c in range(columns - n + 1):
+            window = [grid[r+i][c+i] for i in range(n)]
+            score += evaluate_window(window, piece, weights)
 
     # Score negative diagonal
-    for r in range(3, 6):
-        for c in range(4):
-            window = [board.grid[r-i][c+i] for i in range(4)]
-            score += evaluate_window(window, piece)
+    for r in range(n - 1, rows):
+        for c in range(columns - n + 1):
+            window = [grid[r-i][c+i] for i in range(n)]
+            score += evaluate_window(window, piece, weights)
 
     return score
 
-def utility(board, ai_piece, player_piece):
-    """Heuristic function returns score of current board state."""
-    if board.winning_move(ai_piece):
-        return (None, math.inf)
-    elif board.winning_move(player_piece):
-        return (None, -math.inf)
+def win_score(board: Board) -> int:
+    """Score of the board for the player who just won it, from that player's point of view."""
+    return WIN_SCORE - len(board.moves)
+
+def is_win_score(value: float | None) -> bool:
+    """True if value is a forced win or loss rather than a heuristic score."""
+    return value is not None and abs(value) >= WIN_SCORE // 2
+
+def evaluate_leaf(board: Board, ai_piece: str, context: SearchContext) -> float:
+    """Heuristic score of a leaf that nobody has won, from the context's evaluator if it has one."""
+    stats = context.stats
+    cache = context.eval_cache
+    if cache is not None:
+        # The score of a position and its mirror image are the same, so they share an entry
+        key = position_key(board, True)[0]
+        score = cache.get(key)
+        if score is not None:
+            stats.eval_cache_hits += 1
+            return score
+    stats.eval_calls += 1
+    if stats.timing:
+        start = time.perf_counter()
+    if context.evaluator is not None:
+        score = context.evaluator.score
     else:
-        return (None, score_position(board, ai_piece))
+        score = score_position(board, ai_piece)
+    if context.threats is not None:
+        score += context.threats.score(board, ai_piece)
+    if stats.timing:
+        stats.eval_time += time.perf_counter() - start
+    if cache is not None:
+        cache.put(key, score)
+    return score
 
 def minimax(
     board: Board,
@@ -73,7 +186,8 @@ def minimax(
     beta: float,
     maximizing_player: bool,
     ai_piece: str,
-    player_piece: str
+    player_piece: str,
+    context: SearchContext | None = None
 ) -> tuple[int, float]:
     """Determines the best column to place a piece.
 
@@ -84,47 +198,266 @@ def minimax(
     depth: Depth of the game tree, with zero being the leaves (the end of the game).
     alpha: The best score that the maximizing player can achieve thus far.
     beta: The best score that the minimizing player can achieve thus far.
-    maximizing_player: True if ...
+    maximizing_player: True if ai_piece is the one to move.
+    context: Search state shared between nodes. A new one is created if omitted.
 
+    Values are from ai_piece's point of view: heuristic scores, or plus or minus win_score()
+    of the final position for a forced win or loss. The search itself is negamax().
     """
-    valid_locations = [c for c in range(7) if board.is_valid_move(c)]
-    is_terminal = board.winning_move(ai_piece) or board.winning_move(
-        player_piece) or board.is_full()
+    if context is None:
+        context = SearchContext()
+    if maximizing_player:
+        return negamax(board, depth, alpha, beta, True, ai_piece, player_piece, context)
+    column, value = negamax(board, depth, -beta, -alpha, False, ai_piece, player_piece, context)
+    return column, -value
+
+def negamax(
+    board: Board,
+    depth: int,
+    alpha: float,
+    beta: float,
+    maximizing_player: bool,
+    ai_piece: str,
+    player_piece: str,
+    context: SearchContext
+) -> tuple[int, float]:
+    """Principal variation search, with values from the point of view of the player to move.
 
-    if is_terminal or depth == 0:
-        return utility(board, ai_piece, player_piece)
+    The first move, the one expected to be best, is searched with the full window. Every
+    other move is searched with a null window that only shows whether it is better than the
+    best so far, and is searched again with the full window if it is.
+
+    maximizing_player is True if ai_piece is to move; leaves are scored for ai_piece and
+    negated when it is not. Moves are played on the board and taken back again, so the board
+    is modified during the search but is left as it was when the call returns.
+    """
+    stats = context.stats
+    stats.nodes += 1
+    stats.nodes_by_depth[depth] = stats.nodes_by_depth.get(depth, 0) + 1
+    context.check_time()
+
+    piece, opponent = (ai_piece, player_piece) if maximizing_player else (player_piece, ai_piece)
+    # Only the player who just moved can have won
+    stats.win_checks += 1
+    if board.winning_move(opponent):
+        return None, -win_score(board)
+    evaluator = context.evaluator
+    if depth == 0 or board.is_full():
+        score = evaluate_leaf(board, ai_piece, context)
+        return None, score if maximizing_player else -score
+
+    # Nothing beats winning with the next move, or is worse than losing to the reply to it
+    ply = len(board.moves)
+    alpha = max(alpha, -(WIN_SCORE - ply - 2))
+    beta = min(beta, WIN_SCORE - ply - 1)
+    if alpha >= beta:
+        return None, alpha
+
+    if stats.timing:
+        movegen_start = time.perf_counter()
+    valid_locations = [c for c in range(board.columns) if board.is_valid_move(c)]
+
+    # Settle the position from its threats if it can be, or drop the moves that lose at once
+    if context.threats is not None:
+        outcome, moves = context.threats.candidate_moves(board, piece)
+        if outcome is not None:
+            stats.threat_cutoffs += 1
+            # A win takes one more move, a loss the opponent's reply to it
+            if outcome == WIN:
+                return moves[0], WIN_SCORE - ply - 1
+            return moves[0], -(WIN_SCORE - ply - 2)
+        stats.threat_pruned_moves += len(valid_locations) - len(moves)
+        valid_locations = moves
+
+    # Reuse the result of an earlier search of this position or its mirror image, if it was deep enough
+    key, mirrored = position_key(board, maximizing_player)
+    table = context.table
+    best_move = orient(board, context.pv_moves.get(key), mirrored)
+    if table is not None:
+        stats.tt_probes += 1
+        entry = table.probe(key, mirrored)
+        if entry is not None:
+            stats.tt_hits += 1
+        if entry is not None and best_move is None:
+            best_move = orient(board, entry[3], mirrored)
+        if entry is not None and (entry[0] == depth if context.exact_depth else entry[0] >= depth):
+            _, flag, tt_value, tt_move = entry
+            tt_move = orient(board, tt_move, mirrored)
+            if flag == EXACT:
+                return tt_move, tt_value
+            if flag == LOWER and tt_value >= beta:
+                return tt_move, tt_value
+            if flag == UPPER and tt_value <= alpha:
+                return tt_move, tt_value
+    alpha_orig = alpha
+
+    # Moves right of center lead to mirror images of the moves left of it
+    if board.is_symmetric():
+        stats.symmetric_nodes += 1
+        valid_locations = [col for col in valid_locations if col <= board.mirror_column(col)]
+
+    ordering = context.ordering
+    if ordering is not None:
+        valid_locations = ordering.order(valid_locations, ply, piece, best_move)
+    elif best_move in valid_locations:
+        valid_locations.remove(best_move)
+        valid_locations.insert(0, best_move)
+    if stats.timing:
+        stats.movegen_time += time.perf_counter() - movegen_start
+
+    value = -math.inf
+    column = valid_locations[0]
+    for index, col in enumerate(valid_locations):
+        board.play(col, piece)
+        if evaluator is not None:
+            evaluator.push(board)
+        if index == 0 or context.full_window:
+            score = -negamax(board, depth - 1, -beta, -alpha, not maximizing_player,
+                             ai_piece, player_piece, context)[1]
+        else:
+            stats.null_window_searches += 1
+            score = -negamax(board, depth - 1, -alpha - 1, -alpha, not maximizing_player,
+                             ai_piece, player_piece, context)[1]
+            if alpha < score < beta:
+                stats.re_searches += 1
+                # The null-window score is a lower bound, so it can serve as alpha
+                score = -negamax(board, depth - 1, -beta, -score, not maximizing_player,
+                                 ai_piece, player_piece, context)[1]
+        if evaluator is not None:
+            evaluator.pop(board)
+        board.undo()
+        if score > value:
+            value = score
+            column = col
+        alpha = max(alpha, value)
+        # Alpha-Beta Pruning
+        if alpha >= beta:
+            stats.cutoffs += 1
+            stats.cutoff_index[index] = stats.cutoff_index.get(index, 0) + 1
+            if ordering is not None:
+                ordering.record_cutoff(col, ply, depth, piece)
+            break
+
+    if table is not None:
+        if value <= alpha_orig:
+            flag = UPPER
+        elif value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        table.store(key, depth, flag, value, orient(board, column, mirrored), mirrored)
+    return column, value
+
+
+def principal_variation(
+    board: Board,
+    table: TranspositionTable,
+    ai_piece: str,
+    player_piece: str,
+    max_length: int
+) -> dict[int, int]:
+    """Follows the best moves stored in the table from the current position.
+
+    Returns the line as a mapping of position key to best move in the key's orientation, which
+    is the form SearchContext.pv_moves expects.
+    """
+    pv_moves = {}
+    maximizing_player = True
+    played = 0
+    while played < max_length:
+        key, mirrored = position_key(board, maximizing_player)
+        entry = table.probe(key, mirrored)
+        if entry is None or entry[3] is None:
+            break
+        move = orient(board, entry[3], mirrored)
+        if not board.is_valid_move(move):
+            break
+        pv_moves[key] = entry[3]
+        piece = ai_piece if maximizing_player else player_piece
+        board.play(move, piece)
+        played += 1
+        if board.winning_move(piece):
+            break
+        maximizing_player = not maximizing_player
+    for _ in range(played):
+        board.undo()
+    return pv_moves
+
+def aspiration_search(
+    board: Board,
+    depth: int,
+    guess: float,
+    ai_piece: str,
+    player_piece: str,
+    context: SearchContext,
+    window: float = ASPIRATION_WINDOW
+) -> tuple[int, float]:
+    """Searches the root with a narrow window around guess, the value expected from it.
+
+    A narrow window prunes more than the full one. If the value falls outside it, the side
+    it fell through is widened, twice as far each time, and the root is searched again.
+    """
+    alpha, beta = guess - window, guess + window
+    while True:
+        column, value = minimax(board, depth, alpha, beta, True, ai_piece, player_piece, context)
+        if alpha < value < beta:
+            return column, value
+        context.stats.aspiration_fails += 1
+        if value <= alpha:
+            alpha = -math.inf if is_win_score(value) else value - window
+        else:
+            beta = math.inf if is_win_score(value) else value + window
+        window *= 2
+
+def iterative_deepening(
+    board: Board,
+    time_limit_ms: float,
+    ai_piece: str,
+    player_piece: str,
+    max_depth: int | None = None,
+    context: SearchContext | None = None
+) -> tuple[int, float, int]:
+    """Searches one ply deeper at a time until the time budget runs out.
+
+    Each iteration orders moves by the principal variation of the one before it and searches
+    the root with an aspiration window around its value, see aspiration_search(). The first
+    iteration always completes so that a move is available however small the budget is.
+
+    Returns the column and value from the deepest completed search, and that depth.
+    """
+    if context is None:
+        context = SearchContext()
+    empty_cells = board.geometry.cells - len(board.moves)
+    if max_depth is None or max_depth > empty_cells:
+        max_depth = empty_cells
+
+    root_moves = len(board.moves)
+    deadline = time.perf_counter() + time_limit_ms / 1000
+    best = (None, None, 0)
+    context.deadline = None
+    for depth in range(1, max_depth + 1):
+        try:
+            if best[1] is None or context.full_window:
+                column, value = minimax(board, depth, -math.inf, math.inf, True,
+                                        ai_piece, player_piece, context)
+            else:
+                column, value = aspiration_search(board, depth, best[1], ai_piece, player_piece, context)
+        except SearchTimeout:
+            # The aborted search leaves its moves on the board
+            while len(board.moves) > root_moves:
+                board.undo()
+            break
+
+        best = (column, value, depth)
+        key, mirrored = position_key(board, True)
+        context.pv_moves = {key: orient(board, column, mirrored)}
+        if context.table is not None:
+            context.pv_moves.update(
+                principal_variation(board, context.table, ai_piece, player_piece, depth))
+        # A forced win or loss will not change with more depth
+        if is_win_score(value) or time.perf_counter() > deadline:
+            break
+        context.deadline = deadline
+    context.deadline = None
+    return best
 
-    if maximizing_player:
-        value = -math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            temp_board = board.copy()
-            row = temp_board.get_next_open_row(col)
-            temp_board.drop_piece(row, col, ai_piece)
-            new_score = minimax(temp_board, depth - 1, alpha,
-                                beta, False, ai_piece, player_piece)[1]
-            if new_score > value:
-                value = new_score
-                column = col
-            alpha = max(alpha, value)
-            # Alpha-Beta Pruning
-            if alpha >= beta:
-                break
-        return column, value
-    else:
-        value = math.inf
-        column = random.choice(valid_locations)
-        for col in valid_locations:
-            temp_board = board.copy()
-            row = temp_board.get_next_open_row(col)
-            temp_board.drop_piece(row, col, player_piece)
-            new_score = minimax(temp_board, depth - 1, alpha,
-                                beta, True, ai_piece, player_piece)[1]
-            if new_score < value:
-                value = new_score
-                column = col
-            beta = min(beta, value)
-            # Alpha-Beta Pruning
-            if alpha >= beta:
-                break
-        return column, value
@@ -0,0 +1,61 @@
+from board import Board
+
+
+def center_order(columns: int) -> list[int]:
+    """Columns from the center outwards, e.g. [3, 2, 4, 1, 5, 0, 6] for seven columns."""
+    return sorted(range(columns), key=lambda col: (abs(2 * col - (columns - 1)), col))
+
+
+class MoveOrdering:
+    """
+    Decides the order in which minimax tries moves. Good moves searched first let alpha-beta
+    pruning cut off more of the tree.
+
+    Moves are tried in this order: the best move remembered for the position (from the
+    principal variation or the transposition table), then the killer moves for the ply, then
+    the rest by history score, with ties broken center-out.
+
+    Attributes:
+        use_killers (bool): Try moves that caused a cutoff at the same ply first.
+        use_history (bool): Prefer moves that have caused cutoffs anywhere in the tree.
+        columns (int): Number of columns of the boards searched.
+        killers (dict[int, List[int]]): Up to two killer moves for each ply.
+        history (dict[str, List[int]]): Cutoff score of every column for each piece.
+    """
+
+    def __init__(self, use_killers=True, use_history=True, columns=Board.COLUMNS):
+        self.use_killers = use_killers
+        self.use_history = use_history
+        self.columns = columns
+        self.static_order = center_order(columns)
+        self.killers = {}
+        self.history = {piece: [0] * columns for piece in Board.PIECES}
+
+    def order(self, valid_locations: list[int], ply: int, piece: str,
+              best_move: int | None = None) -> list[int]:
+        rank = {col: i for i, col in enumerate(self.static_order)}
+        moves = sorted(valid_locations, key=rank.__getitem__)
+        if self.use_history:
+            history = self.history[piece]
+            moves.sort(key=lambda col: -history[col])
+
+        front = []
+        if best_move is not None:
+            front.append(best_move)
+        if self.use_killers:
+            front.extend(self.killers.get(ply, ()))
+        for col in reversed(front):
+            if col in moves:
+                moves.remove(col)
+                moves.insert(0, col)
+        return moves
+
+    def record_cutoff(self, col: int, ply: int, depth: int, piece: str) -> None:
+        """Remember a move that caused a beta cutoff."""
+        if self.use_killers:
+            killers = self.killers.setdefault(ply, [])
+            if col not in killers:
+                killers.insert(0, col)
+                del killers[2:]
+        if self.use_history:
+            self.history[piece][col] += depth * depth
@@ -0,0 +1,157 @@
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from board import Board
+from evaluation import IncrementalEvaluator
+from minimax import SearchCancelled, SearchContext, minimax
+from ordering import MoveOrdering, center_order
+from stats import SearchStats
+from threats import ThreatAnalyzer
+from transposition import TranspositionTable
+
+# Set in each worker process by _init_worker()
+_shared_alpha = None
+_worker_table = None
+
+
+def _init_worker(shared_alpha) -> None:
+    global _shared_alpha, _worker_table
+    _shared_alpha = shared_alpha
+    _worker_table = TranspositionTable()
+
+
+def _search_root_move(board, col, depth, ai_piece, player_piece, weights):
+    """Search one root move in a worker process.
+
+    Starts from the best score any worker has found so far, so the move is only searched
+    as deeply as it takes to show it is no better. Returns (col, value, exact, nodes).
+    """
+    board.play(col, ai_piece)
+    alpha = _shared_alpha.value
+    context = SearchContext(
+        table=_worker_table,
+        ordering=MoveOrdering(columns=board.columns),
+        evaluator=IncrementalEvaluator(board, ai_piece, weights),
+        threats=ThreatAnalyzer()
+    )
+    _, value = minimax(board, depth - 1, alpha, math.inf, False, ai_piece, player_piece, context)
+
+    with _shared_alpha.get_lock():
+        if value > _shared_alpha.value:
+            _shared_alpha.value = value
+    # A value at or below the alpha it was searched with is only an upper bound
+    return col, value, value > alpha, context.stats.nodes
+
+
+class ParallelSearch:
+    """
+    Root-parallel minimax: each move from the current position is searched in its own
+    worker process. Workers share the best score found so far as their alpha bound.
+
+    Attributes:
+        workers (int): Number of worker processes.
+        shared_alpha (multiprocessing.Value): Best root score found so far.
+        executor (ProcessPoolExecutor): Worker pool, started on the first search.
+    """
+
+    def __init__(self, workers: int | None = None):
+        self.workers = workers or os.cpu_count() or 1
+        # Spawned rather than forked workers, since the game searches from a thread
+        self.context = multiprocessing.get_context("spawn")
+        self.shared_alpha = self.context.Value("d", -math.inf)
+        self.executor = None
+
+    def search(
+        self,
+        board: Board,
+        depth: int,
+        ai_piece: str,
+        player_piece: str,
+        weights=None,
+        stats: SearchStats | None = None,
+        stop=None
+    ) -> tuple[int, float]:
+        """Returns the best column and its value, like minimax() at the root."""
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=self.context,
+                initializer=_init_worker,
+                initargs=(self.shared_alpha,)
+            )
+        with self.shared_alpha.get_lock():
+            self.shared_alpha.value = -math.inf
+
+        # Submit the central moves first, as they usually raise alpha the most
+        moves = [col for col in center_order(board.columns) if board.is_valid_move(col)]
+        # Moves right of center in a symmetric position mirror those left of it
+        if board.is_symmetric():
+            moves = [col for col in moves if col <= board.mirror_column(col)]
+        pending = {self.executor.submit(_search_root_move, board, col, depth,
+                                        ai_piece, player_piece, weights) for col in moves}
+        results = []
+        while pending:
+            done, pending = wait(pending, timeout=0.05, return_when=FIRST_COMPLETED)
+            results.extend(future.result() for future in done)
+            if stop is not None and stop.is_set():
+                for future in pending:
+                    future.cancel()
+                raise SearchCancelled()
+
+        if stats is not None:
+            stats.nodes += sum(nodes for _, _, _, nodes in results)
+        rank = {col: i for i, col in enumerate(moves)}
+        exact = [result for result in results if result[2]] or results
+        col, value, _, _ = max(exact, key=lambda result: (result[1], -rank[result[0]]))
+        return col, value
+
+    def shutdown(self) -> None:
+        """Stops the worker pool without waiting, so a game can restart during a deep search.
+
+        Root searches already running finish in the background and their workers then exit.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+
+def benchmark_speedup(
+    board: Board,
+    depth: int,
+    ai_piece: str,
+    player_piece: str,
+    core_counts: list[int] | None = None
+) -> list[dict]:
+    """Times a parallel search of the board against the serial search for several core counts."""
+    if core_counts is None:
+        core_counts = sorted({1, 2, 4, os.cpu_count() or 1})
+
+    context = SearchContext(
+        table=TranspositionTable(),
+        ordering=MoveOrdering(columns=board.columns),
+        evaluator=IncrementalEvaluator(board, ai_piece),
+        threats=ThreatAnalyzer()
+    )
+    start = time.perf_counter()
+    minimax(board, depth, -math.inf, math.inf, True, ai_piece, player_piece, context)
+    serial_time = time.perf_counter() - start
+
+    results = [{"workers": 0, "seconds": serial_time, "speedup": 1.0, "nodes": context.stats.nodes}]
+    for workers in core_counts:
+        search = ParallelSearch(workers)
+        # Warm the pool up so process start-up is not timed
+        search.search(board, 1, ai_piece, player_piece)
+        stats = SearchStats()
+        start = time.perf_counter()
+        search.search(board, depth, ai_piece, player_piece, stats=stats)
+        seconds = time.perf_counter() - start
+        search.shutdown()
+        results.append({
+            "workers": workers,
+            "seconds": seconds,
+            "speedup": serial_time / seconds if seconds else 0.0,
+            "nodes": stats.nodes,
+        })
+    return results
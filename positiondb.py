@@ -0,0 +1,201 @@
+"""On-disk database of evaluated positions.
+
+The file holds fixed-width records sorted by position key, so it can be binary searched in
+place. Readers memory-map it, which keeps lookups off the Python heap and makes opening
+the file instant whatever its size.
+
+    python -m positiondb build positions.jsonl positions.db
+
+Each input line is a JSON object with "moves", a move string starting with X, and optionally
+"score" and "move", both for the player to move. Positions without a score are solved.
+Records are keyed on the player to move, so positions reached with O moving first are
+looked up correctly.
+A database holds positions of one board size, given with --rows, --columns and --connect.
+"""
+import argparse
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+from board import Board, Geometry
+
+MAGIC = b"C4DB"
+# Magic, version, rows, columns, connect, number of records
+HEADER = struct.Struct("<4sBBBBQ")
+# Position key, score for the player to move, best move (-1 if none), padding
+RECORD = struct.Struct("<Qhbx")
+VERSION = 3
+
+
+def board_key(board: Board, piece: str) -> tuple[int, bool]:
+    """Key shared by a position and its mirror image, and whether the board is the mirrored one.
+
+    Within a column, the pieces of the player to move added to the occupied cells give a
+    unique pattern, as in solver.position_key(), so the key identifies the position and the
+    side to move exactly. Scores are stored for the player to move.
+    """
+    if board.columns * board.height > 64:
+        raise ValueError(f"A {board.rows}x{board.columns} board does not fit in a 64-bit key.")
+    current = board.bitboards[piece]
+    occupied = board.bitboards["X"] | board.bitboards["O"]
+    key = current + occupied
+    mirror_key = board.mirror_mask(current) + board.mirror_mask(occupied)
+    if mirror_key < key:
+        return mirror_key, True
+    return key, False
+
+
+class PositionDatabase:
+    """
+    Read-only, memory-mapped database of position scores and best moves. Boards of another
+    size than the database's are never found.
+
+    Attributes:
+        path (str): Location of the database file.
+        geometry (Geometry): Size of the boards in the database.
+        count (int): Number of records.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, rows, columns, connect, self.count = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} position database.")
+        self.geometry = Geometry.get(rows, columns, connect)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def key_at(self, index: int) -> int:
+        return struct.unpack_from("<Q", self.data, HEADER.size + index * RECORD.size)[0]
+
+    def _search(self, key: int, low: int = 0) -> int:
+        """Index of the first record with a key of at least key, searching from low."""
+        return bisect.bisect_left(_Keys(self), key, low, self.count)
+
+    def lookup_key(self, key: int) -> tuple[int, int] | None:
+        """The (score for the player to move, best move) stored under a key, or None."""
+        index = self._search(key)
+        if index < self.count:
+            record_key, score, move = RECORD.unpack_from(self.data, HEADER.size + index * RECORD.size)
+            if record_key == key:
+                return score, move
+        return None
+
+    def lookup(self, board: Board, piece: str) -> tuple[int, int | None] | None:
+        """The score and the best move of a board with piece to move, or None if it is not stored."""
+        if board.geometry is not self.geometry:
+            return None
+        key, mirrored = board_key(board, piece)
+        return self._orient(board, self.lookup_key(key), mirrored)
+
+    def lookup_many(self, boards: list[Board]) -> list[tuple[int, int | None] | None]:
+        """Looks up many boards at once, each for the player to move on it.
+
+        The player to move follows from the piece that moved first, or is X on an empty board.
+        The keys are searched in sorted order, so each search starts where the last one ended.
+        """
+        keys = {i: board_key(board, board.next_piece(board.moves[0][1] if board.moves else "X"))
+                for i, board in enumerate(boards) if board.geometry is self.geometry}
+        results = [None] * len(boards)
+        low = 0
+        for i in sorted(keys, key=lambda i: keys[i][0]):
+            key, mirrored = keys[i]
+            low = self._search(key, low)
+            if low < self.count:
+                record_key, score, move = RECORD.unpack_from(self.data, HEADER.size + low * RECORD.size)
+                if record_key == key:
+                    results[i] = self._orient(boards[i], (score, move), mirrored)
+        return results
+
+    @staticmethod
+    def _orient(board: Board, record, mirrored: bool):
+        if record is None:
+            return None
+        score, move = record
+        if move < 0:
+            move = None
+        elif mirrored:
+            move = board.mirror_column(move)
+        return score, move
+
+    def close(self) -> None:
+        self.data.close()
+        self.file.close()
+
+
+class _Keys:
+    """Sequence view of the keys in a database, for bisect."""
+
+    def __init__(self, database: PositionDatabase):
+        self.database = database
+
+    def __len__(self) -> int:
+        return self.database.count
+
+    def __getitem__(self, index: int) -> int:
+        return self.database.key_at(index)
+
+
+def write_database(path: str, geometry: Geometry, records: dict[int, tuple[int, int]]) -> None:
+    """Writes records of key: (score for the player to move, best move or -1), sorted by key."""
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, geometry.rows, geometry.columns, geometry.connect, len(records)))
+        for key in sorted(records):
+            score, move = records[key]
+            f.write(RECORD.pack(key, score, move))
+
+
+def build(lines, path: str, geometry: Geometry | None = None, solver=None) -> int:
+    """Builds a database from JSON lines of positions. Returns the number of records written."""
+    geometry = geometry if geometry is not None else Geometry.get()
+    records = {}
+    for line in lines:
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        board = Board.from_moves(entry["moves"], rows=geometry.rows, columns=geometry.columns,
+                                 connect=geometry.connect)
+        piece = board.next_piece()
+        score, move = entry.get("score"), entry.get("move")
+        if score is None:
+            if solver is None:
+                from solver import Solver
+                solver = Solver(geometry=geometry)
+            move, score = solver.best_move(board, piece)
+        key, mirrored = board_key(board, piece)
+        if move is None:
+            move = -1
+        elif mirrored:
+            move = board.mirror_column(move)
+        records[key] = (score, move)
+    write_database(path, geometry, records)
+    return len(records)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Build an on-disk database of evaluated positions.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="Build a database from a JSON lines file.")
+    build_parser.add_argument("input", help="JSON lines of positions, or - for stdin.")
+    build_parser.add_argument("output")
+    build_parser.add_argument("--rows", type=int, default=Board.ROWS)
+    build_parser.add_argument("--columns", type=int, default=Board.COLUMNS)
+    build_parser.add_argument("--connect", type=int, default=Board.CONNECT)
+    args = parser.parse_args(argv)
+
+    geometry = Geometry.get(args.rows, args.columns, args.connect)
+    if args.input == "-":
+        count = build(sys.stdin, args.output, geometry)
+    else:
+        with open(args.input) as f:
+            count = build(f, args.output, geometry)
+    print(f"Wrote {count} positions to {args.output} ({os.path.getsize(args.output)} bytes)")
+
+
+if __name__ == "__main__":
+    main()
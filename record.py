@@ -0,0 +1,121 @@
+"""Records of played games, kept as JSON Lines.
+
+Each game is one line:
+
+    {"version": 1, "rows": 6, "columns": 7, "connect": 4, "started": 1760000000.0,
+     "players": {"X": "Player", "O": "Computer"}, "first": "X", "moves": "3324",
+     "times_ms": [1520.0, 2130.5, 4410.2, 4890.7],
+     "ai": [null, {"nodes": 753, "depth": 6, "value": 12}, null, {...}], "result": "X"}
+
+"moves" holds the columns played, starting with the "first" piece. "times_ms" is when each
+move was made, in milliseconds since "started" (seconds since the epoch). "ai" holds the
+computer's search statistics for the moves it made and null for the others. "result" is the
+winning piece, "draw", or null for a game left unfinished.
+"""
+import json
+import time
+from board import Board
+
+VERSION = 1
+
+
+def ai_move_stats(player) -> dict:
+    """The statistics of a computer player's latest move that go into a record."""
+    return {
+        "nodes": player.last_stats.nodes,
+        "depth": player.last_depth,
+        "value": player.last_value,
+    }
+
+
+class GameRecord:
+    """
+    Record of one game, built up move by move.
+
+    Attributes:
+        rows (int): Number of rows of the board.
+        columns (int): Number of columns of the board.
+        connect (int): Pieces in a row needed to win.
+        players (dict[str, str]): Name of the player of each piece.
+        first (str): Piece that moved first.
+        started (float): time.time() at the start of the game.
+        moves (str): Columns played, one digit per move.
+        times_ms (list[float]): Time of each move since the start, in milliseconds.
+        ai (list[dict]): Search statistics of each move made by the computer, None for others.
+        result (str): Winning piece, "draw", or None while the game is unfinished.
+    """
+
+    def __init__(
+        self,
+        rows: int = Board.ROWS,
+        columns: int = Board.COLUMNS,
+        connect: int = Board.CONNECT,
+        players: dict[str, str] | None = None,
+        first: str = "X",
+        started: float | None = None
+    ):
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.players = players if players is not None else {}
+        self.first = first
+        self.started = started if started is not None else time.time()
+        self.moves = ""
+        self.times_ms = []
+        self.ai = []
+        self.result = None
+
+    def add_move(self, col: int, stats: dict | None = None) -> None:
+        """Records a move made now, with the computer's search statistics if it made it."""
+        self.moves += str(col)
+        self.times_ms.append(round((time.time() - self.started) * 1000, 1))
+        self.ai.append(stats)
+
+    def to_dict(self) -> dict:
+        return {
+            "version": VERSION,
+            "rows": self.rows,
+            "columns": self.columns,
+            "connect": self.connect,
+            "started": self.started,
+            "players": self.players,
+            "first": self.first,
+            "moves": self.moves,
+            "times_ms": self.times_ms,
+            "ai": self.ai,
+            "result": self.result,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "GameRecord":
+        """Reads a record. Only "moves" is required, so arena games can be read too.
+
+        Raises ValueError if a field has the wrong type or the board size is out of range.
+        Whether the moves can be played is not checked.
+        """
+        if not isinstance(data, dict) or not isinstance(data.get("moves"), str):
+            raise ValueError('A record needs "moves", a string of column digits.')
+        if data.get("first", "X") not in ("X", "O"):
+            raise ValueError(f'"first" must be "X" or "O", not {data["first"]!r}.')
+        for field in ("rows", "columns", "connect"):
+            value = data.get(field, 1)
+            if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= Board.MAX_SIZE:
+                raise ValueError(f'"{field}" must be a whole number from 1 to {Board.MAX_SIZE}, not {value!r}.')
+        record = cls(
+            data.get("rows", Board.ROWS),
+            data.get("columns", Board.COLUMNS),
+            data.get("connect", Board.CONNECT),
+            data.get("players"),
+            data.get("first", "X"),
+            data.get("started", 0.0)
+        )
+        record.moves = data["moves"]
+        record.times_ms = data.get("times_ms", [])
+        record.ai = data.get("ai", [])
+        record.result = data.get("result")
+        return record
+
+    def write(self, path: str) -> None:
+        """Appends the record to a JSON Lines file."""
+        with open(path, "a") as f:
+            f.write(json.dumps(self.to_dict()) + "\n")
@@ -0,0 +1,288 @@
+"""Headless move server for the computer player.
+
+Reads requests as JSON lines and answers each with a JSON line, on stdin/stdout or on a local
+socket. A request gives a position as a move string starting with X, and how hard to think:
+
+    {"id": 1, "moves": "3324", "difficulty": "very hard"}
+    {"id": 2, "moves": "33", "time_limit_ms": 500}
+
+"rows", "columns" and "connect" select another board size. The answer carries the same id:
+
+    {"id": 1, "move": 3, "score": 12, "depth": 6, "ms": 31.5, "stats": {...}, "table": {...},
+     "eval_cache": {...}}
+
+"stats" counts the search of this request. "table" gives the size, hit rate and collision
+rate of the worker's transposition table, which is shared by the searches it has run.
+"eval_cache" gives the hit rate and memory of the leaf score cache of this request's search.
+
+A forced result is sent as a score of "win" or "loss", with "plies" the number of moves left
+until the game ends. A bad request gets an "error" instead. Answers can come back in a different order from the requests.
+
+    python -m server
+    python -m server --port 8765
+    python -m server --unix /tmp/connect4.sock
+"""
+import argparse
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from ai import AIPlayer
+from board import Board, Geometry
+from minimax import WIN_SCORE, is_win_score
+from transposition import TranspositionTable
+
+# Buckets of each transposition table a worker keeps; a full table takes about 20 MB
+WORKER_TABLE_SIZE = 1 << 16
+# Transposition tables each worker keeps before starting over, so a worker holds at most about
+# 120 MB of tables: enough for every search depth and time-limited searches on one board size
+WORKER_TABLES = 6
+
+# Set in each worker process: the transposition tables of each board size and way of searching,
+# and the solver of each board size, shared by every search the worker runs
+_worker_tables = None
+_worker_solvers = None
+
+
+def _init_worker() -> None:
+    global _worker_tables, _worker_solvers
+    _worker_tables = {}
+    _worker_solvers = {}
+
+
+def _search(request: dict) -> dict:
+    """Answers one request in a worker process."""
+    geometry = Geometry.get(request["rows"], request["columns"], request["connect"])
+    board = Board.from_moves(request["moves"], rows=geometry.rows, columns=geometry.columns,
+                             connect=geometry.connect)
+    if board.winning_move("X") or board.winning_move("O") or board.is_full():
+        raise ValueError("The game is already over.")
+
+    piece = board.next_piece()
+    player = AIPlayer(piece, request["difficulty"], time_limit_ms=request["time_limit_ms"])
+    # Keys mark whether the maximizing player is to move, which together with the position
+    # fixes whose point of view a value is from, so one table serves both pieces. Deeper
+    # entries are taken as they are, so fixed-depth searches only share a table with searches
+    # of the same depth, or an easy request would answer with a very hard result. Deeper
+    # entries only help a time-limited search, so those all share one table whatever the time
+    if request["time_limit_ms"] is None:
+        table_key = (geometry, AIPlayer.DIFFICULTY_DEPTHS[request["difficulty"]])
+    else:
+        table_key = (geometry, None)
+    if table_key not in _worker_tables:
+        if len(_worker_tables) >= WORKER_TABLES:
+            _worker_tables.clear()
+        _worker_tables[table_key] = TranspositionTable(WORKER_TABLE_SIZE)
+    player.table = _worker_tables[table_key]
+    player.solver = _worker_solvers.get(geometry)
+
+    start = time.perf_counter()
+    move = player.get_move(board)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if player.solver is not None:
+        _worker_solvers[geometry] = player.solver
+
+    response = {"move": move, "score": player.last_value}
+    if is_win_score(player.last_value):
+        response["score"] = "win" if player.last_value > 0 else "loss"
+        response["plies"] = WIN_SCORE - abs(player.last_value) - len(board.moves)
+    response.update(depth=player.last_depth, ms=elapsed_ms, stats=player.last_stats.as_dict(),
+                    table=player.table.as_dict(), eval_cache=player.eval_cache.as_dict())
+    return response
+
+
+def _is_number(value) -> bool:
+    # JSON true and false are read as bools, which Python counts as ints
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def parse_request(line: str) -> dict:
+    """Reads and checks a request line, filling in defaults. Raises ValueError if it is invalid."""
+    return check_request(json.loads(line))
+
+
+def check_request(request) -> dict:
+    """Checks a request read from JSON, filling in defaults. Raises ValueError if it is invalid."""
+    if not isinstance(request, dict) or not isinstance(request.get("moves"), str):
+        raise ValueError('A request needs "moves", a string of column digits.')
+    request.setdefault("id", None)
+    request.setdefault("difficulty", "hard")
+    request.setdefault("time_limit_ms", None)
+    request.setdefault("rows", Board.ROWS)
+    request.setdefault("columns", Board.COLUMNS)
+    request.setdefault("connect", Board.CONNECT)
+
+    if isinstance(request["difficulty"], str):
+        request["difficulty"] = AIPlayer.DIFFICULTY_ALIASES.get(request["difficulty"], request["difficulty"])
+    if not isinstance(request["difficulty"], str) or request["difficulty"] not in AIPlayer.DIFFICULTY_DEPTHS:
+        raise ValueError(f"Unknown difficulty {request['difficulty']!r}.")
+    time_limit_ms = request["time_limit_ms"]
+    if time_limit_ms is not None and not (_is_number(time_limit_ms) and 0 < time_limit_ms < math.inf):
+        raise ValueError(f'"time_limit_ms" must be a positive number, not {time_limit_ms!r}.')
+    for field in ("rows", "columns", "connect"):
+        value = request[field]
+        if not isinstance(value, int) or isinstance(value, bool) or not 1 <= value <= Board.MAX_SIZE:
+            raise ValueError(f'"{field}" must be a whole number from 1 to {Board.MAX_SIZE}, not {value!r}.')
+    # Raises ValueError for a win length that does not fit the board
+    Geometry.get(request["rows"], request["columns"], request["connect"])
+    return request
+
+
+class MoveServer:
+    """
+    Answers move requests with a pool of worker processes.
+
+    Requests wait in a queue and at most one search per worker runs at a time, so a burst of
+    clients cannot oversubscribe the machine.
+
+    Attributes:
+        workers (int): Number of worker processes, and of searches run at once.
+        queue_size (int): Requests that can wait before new ones are held back.
+        queue (asyncio.Queue): Requests waiting for a worker, with the future to answer them on.
+        executor (ProcessPoolExecutor): Worker processes, each with its own transposition tables.
+    """
+
+    def __init__(self, workers: int | None = None, queue_size: int = 1000):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.queue = None
+        self.executor = None
+        self.dispatchers = []
+
+    async def start(self) -> None:
+        self.queue = asyncio.Queue(self.queue_size)
+        # Spawned rather than forked workers, since stdin is read on a thread
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker
+        )
+        self.dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self.dispatchers:
+            task.cancel()
+        await asyncio.gather(*self.dispatchers, return_exceptions=True)
+        self.executor.shutdown(cancel_futures=True)
+
+    async def _dispatch(self) -> None:
+        """Feeds queued requests to the worker pool, one at a time."""
+        loop = asyncio.get_running_loop()
+        while True:
+            request, future = await self.queue.get()
+            try:
+                result = await loop.run_in_executor(self.executor, _search, request)
+            except Exception as error:
+                if not future.done():
+                    future.set_exception(error)
+            else:
+                if not future.done():
+                    future.set_result(result)
+            finally:
+                self.queue.task_done()
+
+    async def handle(self, line: bytes | str) -> dict:
+        """The response to one request line."""
+        try:
+            if isinstance(line, bytes):
+                line = line.decode()
+            request = json.loads(line)
+        except ValueError as error:
+            # Also raised for bytes that are not UTF-8
+            return {"id": None, "error": f"A request must be a line of JSON: {error}"}
+        # A request that fails its checks is still answered with its id, if it has one
+        request_id = request.get("id") if isinstance(request, dict) else None
+        try:
+            request = check_request(request)
+        except ValueError as error:
+            return {"id": request_id, "error": str(error)}
+
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        try:
+            response = await future
+        except Exception as error:
+            return {"id": request["id"], "error": str(error)}
+        return {"id": request["id"], **response}
+
+    async def serve_stdio(self) -> None:
+        """Answers requests from stdin on stdout until stdin closes."""
+        pending = set()
+
+        async def answer(line: bytes) -> None:
+            response = await self.handle(line)
+            sys.stdout.write(json.dumps(response) + "\n")
+            sys.stdout.flush()
+
+        while True:
+            # Read as bytes, so a line that is not UTF-8 only fails its own request
+            line = await asyncio.to_thread(sys.stdin.buffer.readline)
+            if not line:
+                break
+            if line.strip():
+                task = asyncio.create_task(answer(line))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+
+    async def serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        """Answers the requests of one socket client until it disconnects."""
+        pending = set()
+
+        async def answer(line: bytes) -> None:
+            response = await self.handle(line)
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+        except ConnectionError:
+            pass
+        finally:
+            # Answer the requests already read before closing, even if the client has gone
+            await asyncio.gather(*pending, return_exceptions=True)
+            writer.close()
+
+
+async def serve(workers: int | None = None, port: int | None = None, unix: str | None = None) -> None:
+    server = MoveServer(workers)
+    await server.start()
+    try:
+        if port is not None:
+            listener = await asyncio.start_server(server.serve_connection, "127.0.0.1", port)
+        elif unix is not None:
+            listener = await asyncio.start_unix_server(server.serve_connection, unix)
+        else:
+            await server.serve_stdio()
+            return
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        await server.stop()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve computer moves as JSON lines.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="Searches run at once. Defaults to the number of cores.")
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--port", type=int, help="Listen on this port of localhost.")
+    transport.add_argument("--unix", help="Listen on a Unix socket at this path.")
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args.workers, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
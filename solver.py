@@ -0,0 +1,300 @@
+import os
+import struct
+import time
+from board import Board, Geometry
+from minimax import WIN_SCORE, SearchCancelled, SearchTimeout
+from ordering import center_order
+from threats import non_losing_moves, possible_moves, winning_cells
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "opening_book.bin")
+BOOK_MAGIC = b"C4BK"
+BOOK_RECORD = struct.Struct("<Qb")
+
+
+def position_key(current: int, mask: int) -> int:
+    """Unique key of a position, with the player to move's pieces as current."""
+    return current + mask
+
+
+def canonical_key(current: int, mask: int, geometry: Geometry) -> int:
+    """Key shared by a position and its mirror image: the smaller of their two keys."""
+    return min(position_key(current, mask),
+               position_key(geometry.mirror_mask(current), geometry.mirror_mask(mask)))
+
+
+def search_score(score: int, moves: int, geometry: Geometry) -> int:
+    """A solver score of a position with the given number of pieces, as a search value.
+
+    Wins and losses become minimax.win_score() values: WIN_SCORE less the number of pieces
+    on the board once the winning piece is played, negated for a loss. A draw stays 0.
+    """
+    if score == 0:
+        return 0
+    # The winner plays after an even number of moves from now if it is the player to move
+    winner_moves = moves if score > 0 else moves + 1
+    before_win = geometry.cells - 2 * abs(score) + (geometry.cells - winner_moves) % 2
+    value = WIN_SCORE - (before_win + 1)
+    return value if score > 0 else -value
+
+
+class OpeningBook:
+    """
+    Solved scores of early positions, read from a binary file on first use.
+
+    The file starts with the magic bytes C4BK and a byte giving the number of plies it covers,
+    followed by records of a little-endian 64-bit position key and a signed 8-bit score.
+    A position and its mirror image have the same score, so only the one with the smaller
+    key is stored. Books are only kept for the standard board.
+
+    Attributes:
+        path (str): Location of the book file.
+        geometry (Geometry): Size of the board the book is for.
+        plies (int): Positions with up to this many pieces are in the book.
+        scores (dict[int, int]): Score of each position for the player to move.
+    """
+
+    def __init__(self, path: str = BOOK_PATH):
+        self.path = path
+        self.geometry = Geometry.get()
+        self.plies = 0
+        self.scores = None
+
+    def _load(self) -> None:
+        self.scores = {}
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            header = f.read(len(BOOK_MAGIC) + 1)
+            if header[:len(BOOK_MAGIC)] != BOOK_MAGIC:
+                raise ValueError(f"{self.path} is not an opening book.")
+            self.plies = header[-1]
+            data = f.read()
+        for key, score in BOOK_RECORD.iter_unpack(data):
+            self.scores[key] = score
+
+    def get(self, current: int, mask: int, moves: int) -> int | None:
+        if self.scores is None:
+            self._load()
+        if moves > self.plies:
+            return None
+        return self.scores.get(canonical_key(current, mask, self.geometry))
+
+    def covers(self, current: int, mask: int, moves: int) -> bool:
+        """Whether the book holds a position and every position one move on from it."""
+        return self.get(current, mask, moves) is not None and moves < self.plies
+
+    @staticmethod
+    def write(path: str, plies: int, scores: dict[int, int]) -> None:
+        with open(path, "wb") as f:
+            f.write(BOOK_MAGIC + bytes([plies]))
+            for key in sorted(scores):
+                f.write(BOOK_RECORD.pack(key, scores[key]))
+
+
+class Solver:
+    """
+    Exact Connect N solver for one board size.
+
+    Negamax with alpha-beta pruning over bitboards, narrowed to null-window searches that
+    home in on the exact score. Moves that lose at once are never searched, and a cache of
+    upper bounds stops positions being solved twice.
+
+    Scores are from the point of view of the player to move: positive is a win, zero a draw
+    and negative a loss. The sooner the win, the larger the score: a win with the player's
+    last piece scores 1.
+
+    Attributes:
+        geometry (Geometry): Size of the boards solved.
+        table_size (int): Number of upper bounds the cache holds.
+        book (OpeningBook): Precomputed scores of opening positions, or None.
+        nodes (int): Positions visited since the solver was created.
+        deadline (float): time.perf_counter() value at which solving gives up, or None.
+        stop (threading.Event): Set from another thread to cancel solving, or None.
+    """
+
+    def __init__(
+        self,
+        table_size=(1 << 20) + 7,
+        book: OpeningBook | None = None,
+        geometry: Geometry | None = None
+    ):
+        self.geometry = geometry if geometry is not None else Geometry.get()
+        if book is not None and book.geometry is not self.geometry:
+            raise ValueError("The opening book is for a different board size.")
+        self.cells = self.geometry.cells
+        # Nobody can win before they have played connect pieces
+        self.min_score = -(self.cells // 2) + self.geometry.connect - 1
+        self.table_size = table_size
+        self.keys = [None] * table_size
+        self.values = [0] * table_size
+        self.book = book
+        self.nodes = 0
+        self.deadline = None
+        self.stop = None
+        self.order = [self.geometry.column_masks[col] for col in center_order(self.geometry.columns)]
+
+    def _check_time(self) -> None:
+        if self.nodes & 4095:
+            return
+        if self.stop is not None and self.stop.is_set():
+            raise SearchCancelled()
+        if self.deadline is not None and time.perf_counter() > self.deadline:
+            raise SearchTimeout()
+
+    def negamax(self, current: int, mask: int, moves: int, alpha: int, beta: int) -> int:
+        """Score of a position where the player to move cannot win immediately.
+
+        Exact if it lies within (alpha, beta). Otherwise it is a bound on the same side of the
+        window as the true score.
+        """
+        self.nodes += 1
+        self._check_time()
+        geometry = self.geometry
+        cells = self.cells
+
+        candidates = non_losing_moves(current, mask, geometry)
+        if not candidates:
+            return -((cells - moves) // 2)
+        if moves >= cells - 2:
+            return 0
+
+        # The opponent cannot win next move, so the player cannot lose that soon
+        low = -((cells - 2 - moves) // 2)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+
+        high = (cells - 1 - moves) // 2
+        key = position_key(current, mask)
+        index = key % self.table_size
+        if self.keys[index] == key:
+            high = self.values[index] + self.min_score - 1
+        elif self.book is not None:
+            score = self.book.get(current, mask, moves)
+            if score is not None:
+                return score
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Try moves that create the most threats first, breaking ties center-out
+        ordered = []
+        for move in self.order:
+            move &= candidates
+            if move:
+                threats = winning_cells(current | move, mask, geometry).bit_count()
+                ordered.append((threats, len(ordered), move))
+        ordered.sort(key=lambda entry: (-entry[0], entry[1]))
+
+        for _, _, move in ordered:
+            score = -self.negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+
+        self.keys[index] = key
+        self.values[index] = alpha - self.min_score + 1
+        return alpha
+
+    def solve(self, current: int, mask: int, moves: int) -> int:
+        """Exact score of a position for the player to move."""
+        geometry = self.geometry
+        cells = self.cells
+        if winning_cells(current, mask, geometry) & possible_moves(mask, geometry):
+            return (cells + 1 - moves) // 2
+
+        low = -((cells - moves) // 2)
+        high = (cells + 1 - moves) // 2
+        # Narrow the range with null-window searches, probing near zero first
+        while low < high:
+            middle = low + (high - low) // 2
+            if middle <= 0 and int(low / 2) < middle:
+                middle = int(low / 2)
+            elif middle >= 0 and high // 2 > middle:
+                middle = high // 2
+            score = self.negamax(current, mask, moves, middle, middle + 1)
+            if score <= middle:
+                high = score
+            else:
+                low = score
+        return low
+
+    def best_move(self, board: Board, piece: str) -> tuple[int, int]:
+        """Best column for piece to play on the board, and its exact score."""
+        if board.geometry is not self.geometry:
+            raise ValueError("The board is not the size the solver was made for.")
+        geometry = self.geometry
+        cells = self.cells
+        current = board.bitboards[piece]
+        mask = current | sum(m for p, m in board.bitboards.items() if p != piece)
+        moves = len(board.moves)
+
+        wins = winning_cells(current, mask, geometry) & possible_moves(mask, geometry)
+        symmetric = board.is_symmetric()
+        best_col, best_score = None, None
+        for col in center_order(geometry.columns):
+            move = possible_moves(mask, geometry) & geometry.column_masks[col]
+            # In a symmetric position the right half mirrors the left
+            if not move or symmetric and col > board.mirror_column(col):
+                continue
+            if move & wins:
+                return col, (cells + 1 - moves) // 2
+
+            child_current, child_mask = current ^ mask, mask | move
+            if best_score is None:
+                score = -self.solve(child_current, child_mask, moves + 1)
+            else:
+                # Only find the exact score if the move beats the best so far
+                if winning_cells(child_current, child_mask, geometry) & possible_moves(child_mask, geometry):
+                    continue
+                if -self.negamax(child_current, child_mask, moves + 1,
+                                 -best_score - 1, -best_score) <= best_score:
+                    continue
+                score = -self.solve(child_current, child_mask, moves + 1)
+            if best_score is None or score > best_score:
+                best_col, best_score = col, score
+        return best_col, best_score
+
+
+def build_book(path: str = BOOK_PATH, plies: int = 6, solver: Solver | None = None) -> int:
+    """Writes a book of every position with up to the given number of pieces.
+
+    Only the positions with exactly that many pieces are solved. The score of an earlier
+    position is the best of its moves: a win at once, or the negated score of the position
+    the move leads to. Returns the number of positions written.
+    """
+    solver = solver if solver is not None else Solver()
+    geometry = solver.geometry
+    scores = {}
+
+    def visit(current: int, mask: int, moves: int) -> int:
+        key = canonical_key(current, mask, geometry)
+        if key in scores:
+            return scores[key]
+        possible = possible_moves(mask, geometry)
+        if winning_cells(current, mask, geometry) & possible:
+            score = (geometry.cells + 1 - moves) // 2
+        elif moves == plies:
+            score = solver.solve(current, mask, moves)
+        else:
+            score = None
+            while possible:
+                move = possible & -possible
+                possible ^= move
+                child = -visit(current ^ mask, mask | move, moves + 1)
+                score = child if score is None else max(score, child)
+        scores[key] = score
+        return score
+
+    visit(0, 0, 0)
+    OpeningBook.write(path, plies, scores)
+    return len(scores)
+
+
+if __name__ == "__main__":
+    import sys
+    plies = int(sys.argv[1]) if len(sys.argv) > 1 else 6
+    print(f"Wrote {build_book(plies=plies)} positions to {BOOK_PATH}")
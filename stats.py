@@ -0,0 +1,128 @@
+import contextlib
+
+
+class SearchStats:
+    """
+    Counters collected while the computer searches for a move.
+
+    Attributes:
+        nodes (int): Number of board states visited.
+        nodes_by_depth (dict[int, int]): Nodes visited at each remaining depth.
+        allocations (int): Number of boards created while the search ran, counted by Board.
+        symmetric_nodes (int): Positions that were their own mirror image, so only half of
+            their moves were searched.
+        cutoffs (int): Number of alpha-beta cutoffs.
+        cutoff_index (dict[int, int]): Cutoffs by the position in the move list of the move
+            that caused them. Most should come from the first move.
+        eval_calls (int): Number of heuristic evaluations.
+        eval_cache_hits (int): Leaves whose score was found in the evaluation cache instead.
+        win_checks (int): Number of four-in-a-row tests.
+        tt_probes (int): Transposition table lookups.
+        tt_hits (int): Lookups that found the position.
+        threat_cutoffs (int): Positions settled by their threats without being searched.
+        threat_pruned_moves (int): Moves left out because they let the opponent win at once.
+        null_window_searches (int): Moves searched only to show they are no better than the
+            first one.
+        re_searches (int): Null-window searches that found a better move, which was then
+            searched again with the full window.
+        aspiration_fails (int): Root searches whose value fell outside the aspiration window.
+        timing (bool): If True, time evaluation and move generation. Reading the clock slows
+            the search down, so this is off by default.
+        eval_time (float): Seconds spent evaluating leaves.
+        movegen_time (float): Seconds spent generating and ordering moves.
+    """
+
+    def __init__(self, timing=False):
+        self.nodes = 0
+        self.nodes_by_depth = {}
+        self.allocations = 0
+        self.symmetric_nodes = 0
+        self.cutoffs = 0
+        self.cutoff_index = {}
+        self.eval_calls = 0
+        self.eval_cache_hits = 0
+        self.win_checks = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.threat_cutoffs = 0
+        self.threat_pruned_moves = 0
+        self.null_window_searches = 0
+        self.re_searches = 0
+        self.aspiration_fails = 0
+        self.timing = timing
+        self.eval_time = 0.0
+        self.movegen_time = 0.0
+
+    @property
+    def allocations_per_node(self) -> float:
+        return self.allocations / self.nodes if self.nodes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        """Share of cutoffs caused by the first move tried, a measure of move ordering."""
+        return self.cutoff_index.get(0, 0) / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "nodes": self.nodes,
+            "nodes_by_depth": dict(sorted(self.nodes_by_depth.items())),
+            "allocations": self.allocations,
+            "allocations_per_node": self.allocations_per_node,
+            "symmetric_nodes": self.symmetric_nodes,
+            "cutoffs": self.cutoffs,
+            "cutoff_index": dict(sorted(self.cutoff_index.items())),
+            "first_move_cutoff_rate": self.first_move_cutoff_rate,
+            "eval_calls": self.eval_calls,
+            "eval_cache_hits": self.eval_cache_hits,
+            "win_checks": self.win_checks,
+            "tt_probes": self.tt_probes,
+            "tt_hits": self.tt_hits,
+            "tt_hit_rate": self.tt_hit_rate,
+            "threat_cutoffs": self.threat_cutoffs,
+            "threat_pruned_moves": self.threat_pruned_moves,
+            "null_window_searches": self.null_window_searches,
+            "re_searches": self.re_searches,
+            "aspiration_fails": self.aspiration_fails,
+            "eval_time": self.eval_time,
+            "movegen_time": self.movegen_time,
+        }
+
+
+@contextlib.contextmanager
+def profiled(mode: str, path: str):
+    """Profiles the code inside the with block and writes a report to path.
+
+    mode is "cprofile" for a call profile sorted by cumulative time, or "tracemalloc" for the
+    lines that allocated the most memory.
+    """
+    # The profilers are imported here since they take longer to import than the engine itself
+    if mode == "cprofile":
+        import cProfile
+        import pstats
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with open(path, "w") as f:
+                pstats.Stats(profiler, stream=f).sort_stats("cumulative").print_stats(40)
+    elif mode == "tracemalloc":
+        import tracemalloc
+        tracemalloc.start()
+        try:
+            yield
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            with open(path, "w") as f:
+                f.write(f"Peak traced memory: {peak} bytes\n")
+                for stat in snapshot.statistics("lineno")[:40]:
+                    f.write(f"{stat}\n")
+    else:
+        raise ValueError(f"Unknown profile mode {mode!r}.")
@@ -0,0 +1,17 @@
+import pygame
+
+# Rendered text surfaces keyed by font, text and color
+_surfaces = {}
+
+
+def render_text(font: pygame.font.Font, text: str, color: tuple[int, int, int]) -> pygame.Surface:
+    """Antialiased text, rendered once per font, text and color and then reused.
+
+    The cache is never emptied, so only use it for the fixed strings of the interface.
+    """
+    key = (font, text, color)
+    surface = _surfaces.get(key)
+    if surface is None:
+        surface = font.render(text, True, color)
+        _surfaces[key] = surface
+    return surface
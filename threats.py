@@ -0,0 +1,142 @@
+import functools
+from board import Board, Geometry
+
+# Outcomes a threat scan can settle a position with, for the player to move
+WIN = 1
+LOSS = -1
+
+
+def winning_cells(position: int, mask: int, geometry: Geometry) -> int:
+    """Empty cells that would complete connect in a row for the pieces in position."""
+    connect = geometry.connect
+    height = geometry.height
+
+    # Vertical
+    r = position << 1
+    for i in range(2, connect):
+        r &= position << i
+
+    # Horizontal and both diagonals
+    for shift in (height, height - 1, height + 1):
+        # Cells with k of the player's pieces in a row just before and just after them
+        before = [-1]
+        after = [-1]
+        for k in range(1, connect):
+            before.append(before[-1] & (position << k * shift))
+            after.append(after[-1] & (position >> k * shift))
+        for k in range(connect):
+            r |= before[k] & after[connect - 1 - k]
+
+    return r & (geometry.board_mask ^ mask)
+
+
+def possible_moves(mask: int, geometry: Geometry) -> int:
+    """The lowest empty cell of every column that is not full."""
+    return (mask + geometry.bottom_mask) & geometry.board_mask
+
+
+def non_losing_moves(current: int, mask: int, geometry: Geometry) -> int:
+    """Moves that do not hand the opponent an immediate win.
+
+    Assumes the player to move cannot win straight away.
+    """
+    possible = possible_moves(mask, geometry)
+    opponent_wins = winning_cells(current ^ mask, mask, geometry)
+    forced = possible & opponent_wins
+    if forced:
+        # Two threats cannot both be blocked
+        if forced & (forced - 1):
+            return 0
+        possible = forced
+    # Do not play directly below a cell where the opponent would win
+    return possible & ~(opponent_wins >> 1)
+
+
+@functools.cache
+def _even_levels(geometry: Geometry) -> int:
+    """Cells on the 1st, 3rd, 5th... row from the bottom."""
+    levels = sum(1 << level for level in range(0, geometry.rows, 2))
+    return sum(levels << (col * geometry.height) for col in range(geometry.columns))
+
+
+class ThreatAnalyzer:
+    """
+    Scans a board for threats: empty cells that would complete a line for one of the players.
+
+    The search uses it to settle positions without searching them, when the player to move can
+    win at once or faces two threats it cannot both block, and to cut the moves searched down
+    to the one forced block, leaving out moves that let the opponent win on top of them. The
+    evaluator uses it to score the threats left on the board at the leaves.
+
+    Threats on alternate rows matter most once the board fills up: the player who moved first
+    can usually claim a cell on an odd row (counting from 1 at the bottom) and the other
+    player one on an even row, so those are the threats each side can expect to cash in.
+
+    Attributes:
+        threat (int): Score of each threat the player has.
+        good_threat (int): Extra score of each threat on the player's own row parity.
+    """
+
+    def __init__(self, threat=4, good_threat=12):
+        self.threat = threat
+        self.good_threat = good_threat
+
+    @staticmethod
+    def threat_mask(board: Board, piece: str) -> int:
+        """Threats of piece as a mask of bit positions."""
+        mask = board.bitboards["X"] | board.bitboards["O"]
+        return winning_cells(board.bitboards[piece], mask, board.geometry)
+
+    @staticmethod
+    def winning_squares(board: Board, piece: str) -> list[tuple[int, int]]:
+        """Threats of piece as (row, column) cells, top row first like Board.grid."""
+        cells = ThreatAnalyzer.threat_mask(board, piece)
+        squares = []
+        while cells:
+            bit = (cells & -cells).bit_length() - 1
+            cells &= cells - 1
+            col, level = divmod(bit, board.height)
+            squares.append((board.rows - 1 - level, col))
+        return sorted(squares)
+
+    @staticmethod
+    def candidate_moves(board: Board, piece: str) -> tuple[int | None, list[int]]:
+        """The moves worth searching for piece, the player to move.
+
+        Returns WIN with the winning column if piece can win at once, LOSS with a move if the
+        opponent wins whatever piece plays, or None with the columns that neither leave an
+        opponent threat unblocked nor fill the cell below one.
+        """
+        geometry = board.geometry
+        mask = board.bitboards["X"] | board.bitboards["O"]
+        current = board.bitboards[piece]
+        playable = possible_moves(mask, geometry)
+
+        wins = winning_cells(current, mask, geometry) & playable
+        if wins:
+            return WIN, [((wins & -wins).bit_length() - 1) // geometry.height]
+
+        candidates = non_losing_moves(current, mask, geometry)
+        if not candidates:
+            # Block one of the threats anyway, in case the opponent misses the other
+            opponent_wins = winning_cells(current ^ mask, mask, geometry) & playable
+            move = opponent_wins or playable
+            return LOSS, [((move & -move).bit_length() - 1) // geometry.height]
+        return None, [col for col in range(geometry.columns) if candidates & geometry.column_masks[col]]
+
+    def score(self, board: Board, piece: str) -> int:
+        """Heuristic score of both players' threats, from piece's point of view."""
+        geometry = board.geometry
+        mask = board.bitboards["X"] | board.bitboards["O"]
+        first_piece = board.moves[0][1] if board.moves else "X"
+        even_levels = _even_levels(geometry)
+        score = 0
+        for player in Board.PIECES:
+            threats = winning_cells(board.bitboards[player], mask, geometry)
+            if not threats:
+                continue
+            # The first player's rows are the odd ones, which are the even levels from 0
+            good = threats & (even_levels if player == first_piece else ~even_levels)
+            value = self.threat * threats.bit_count() + self.good_threat * good.bit_count()
+            score += value if player == piece else -value
+        return score
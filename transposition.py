@@ -0,0 +1,107 @@
+import random
+
+# Bound types for stored values
+EXACT = 0
+LOWER = 1
+UPPER = 2
+
+# Mixed into the board hash when the minimizing player is to move
+MINIMIZING_KEY = random.Random(7).getrandbits(64)
+
+
+class TranspositionTable:
+    """
+    Fixed-size cache of searched positions, keyed by Zobrist hash.
+
+    Each bucket has two slots. The depth-preferred slot keeps the entry that was searched
+    the deepest, and the always-replace slot holds the most recent entry that did not
+    qualify for it. Memory therefore stays flat however long the table is used.
+
+    Entries are tuples of (key, depth, flag, value, move, mirrored). A position and its mirror
+    image share a key; mirrored records which of the two was stored, so that hits served by
+    the other orientation can be counted.
+
+    Attributes:
+        size (int): Number of buckets.
+        probes (int): Number of lookups.
+        hits (int): Lookups that found the position.
+        collisions (int): Lookups whose bucket held only other positions.
+        stores (int): Number of entries written.
+        mirror_hits (int): Hits on an entry stored by the mirror image of the position.
+    """
+
+    def __init__(self, size=1 << 15):
+        self.size = size
+        self.deep = [None] * size
+        self.recent = [None] * size
+        self.probes = 0
+        self.hits = 0
+        self.collisions = 0
+        self.stores = 0
+        self.mirror_hits = 0
+
+    def probe(self, key: int, mirrored: bool = False) -> tuple | None:
+        """Return (depth, flag, value, move) for a position, or None if it is not stored."""
+        self.probes += 1
+        index = key % self.size
+        for entry in (self.deep[index], self.recent[index]):
+            if entry is not None and entry[0] == key:
+                self.hits += 1
+                if entry[5] != mirrored:
+                    self.mirror_hits += 1
+                return entry[1:5]
+        if self.deep[index] is not None or self.recent[index] is not None:
+            self.collisions += 1
+        return None
+
+    def store(
+        self,
+        key: int,
+        depth: int,
+        flag: int,
+        value: float,
+        move: int | None,
+        mirrored: bool = False
+    ) -> None:
+        self.stores += 1
+        index = key % self.size
+        entry = (key, depth, flag, value, move, mirrored)
+        deep = self.deep[index]
+        if deep is None or deep[0] == key or depth >= deep[1]:
+            # Demote the old deep entry rather than losing it
+            if deep is not None and deep[0] != key:
+                self.recent[index] = deep
+            self.deep[index] = entry
+        else:
+            self.recent[index] = entry
+
+    def clear(self) -> None:
+        self.deep = [None] * self.size
+        self.recent = [None] * self.size
+        self.probes = self.hits = self.collisions = self.stores = self.mirror_hits = 0
+
+    @property
+    def hit_rate(self) -> float:
+        return self.hits / self.probes if self.probes else 0.0
+
+    @property
+    def collision_rate(self) -> float:
+        return self.collisions / self.probes if self.probes else 0.0
+
+    @property
+    def mirror_hit_rate(self) -> float:
+        """Share of hits that a table without mirroring would have missed."""
+        return self.mirror_hits / self.hits if self.hits else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "size": self.size,
+            "probes": self.probes,
+            "hits": self.hits,
+            "collisions": self.collisions,
+            "stores": self.stores,
+            "mirror_hits": self.mirror_hits,
+            "hit_rate": self.hit_rate,
+            "collision_rate": self.collision_rate,
+            "mirror_hit_rate": self.mirror_hit_rate,
+        }
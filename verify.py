@@ -0,0 +1,525 @@
+"""Regression checks of the engine against simple reference implementations.
+
+Plays random games and compares the engine with straightforward code that is easy to trust,
+and exits with an error on the first difference:
+
+    python -m verify
+    python -m verify --games 1000 --seed 7
+
+board: the bitboard Board against a list grid that is scanned cell by cell, on several
+board sizes, including undo and the Zobrist hashes.
+
+evaluator: the IncrementalEvaluator against score_position() rescanning the whole board,
+with the default and custom weights, through wins, full boards and undo.
+
+search: minimax() with a transposition table, move ordering, the incremental evaluator and the
+threat scan against a plain negamax that searches every move to the same depth, on random
+positions at depths 1 to 4. Both the value and the value of the move returned must match, and
+iterative_deepening() must reach the same value. The threat scan sees a move that lets the
+opponent win at once as lost whatever the depth left, so the reference scores such moves as
+lost too.
+
+solver: the Solver's solve() and best_move() against a plain negamax that searches every
+move to the end, on small boards and on late positions of the standard board.
+
+batch: the NumPy BatchEvaluator's scores of bitboards and of arrays against score_position(),
+with the default and custom weights, on several board sizes, including one whose bitboards
+do not fit in 64 bits. Skipped if NumPy is not installed.
+
+threats: the threat scan's winning squares against counting, for every empty cell of the list
+grid, each player's pieces in a row through it, on several board sizes.
+
+server: the move server's answers at the solver difficulty against the same negamax, which
+must report wins and losses as "win" or "loss" with the moves left, as searches do.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import server
+from board import Board
+from eval_cache import EvaluationCache
+from evaluation import IncrementalEvaluator, Weights
+from minimax import WIN_SCORE, SearchContext, iterative_deepening, minimax, score_position, win_score
+from ordering import MoveOrdering
+from solver import Solver
+from threats import ThreatAnalyzer
+from transposition import TranspositionTable
+
+# Board sizes as rows, columns and pieces in a row needed to win
+GEOMETRIES = [(6, 7, 4), (7, 8, 4), (5, 6, 3), (4, 5, 4)]
+# Board sizes of the batch check: 9x10 needs 99 bits, more than one 64-bit word
+BATCH_GEOMETRIES = GEOMETRIES + [(9, 10, 4)]
+# Weights unlike the defaults, so a term that ignores the weights shows up
+CUSTOM_WEIGHTS = Weights(four=900, three=12, two=4, opponent_three=-70, center=2)
+# Deepest search the search check compares; the reference searches every move, so each ply
+# multiplies its time by the number of columns
+SEARCH_MAX_DEPTH = 4
+# Board sizes the solver is checked on, with how many random plies lead to each position;
+# the fewer cells left, the smaller the tree the reference solver has to search
+SOLVER_GEOMETRIES = {(6, 7, 4): (28, 34), (5, 6, 4): (16, 20), (4, 5, 3): (6, 10)}
+# Requests with the answer the server must give, whatever the difficulty
+SERVER_REQUESTS = [
+    ({"moves": "6411643546103210", "difficulty": "very hard"}, {"move": 3, "score": "win", "plies": 5}),
+    ({"moves": "6411643546103210", "difficulty": "solver"}, {"move": 3, "score": "win", "plies": 5}),
+]
+
+
+class ReferenceBoard:
+    """
+    The board as a plain list grid, top row first, as it was stored before the bitboards.
+
+    Attributes:
+        rows (int): Number of rows.
+        columns (int): Number of columns.
+        connect (int): Pieces in a row needed to win.
+        grid (List[List[str]]): The game board.
+    """
+
+    def __init__(self, rows: int, columns: int, connect: int):
+        self.rows = rows
+        self.columns = columns
+        self.connect = connect
+        self.grid = [[" " for _ in range(columns)] for _ in range(rows)]
+
+    def is_valid_move(self, col:int) -> bool:
+        if col < 0 or col >= self.columns:
+            return False
+        return self.grid[0][col] == " "
+
+    def get_next_open_row(self, col) -> int | None:
+        for row in reversed(range(self.rows)):
+            if self.grid[row][col] == " ":
+                return row
+        return None
+
+    def drop_piece(self, row:int, col:int, piece: str) -> None:
+        self.grid[row][col] = piece
+
+    def winning_move(self, piece:str) -> bool:
+        # Horizontal, vertical, positive diagonal, negative diagonal
+        for dr, dc in ((0, 1), (1, 0), (-1, 1), (1, 1)):
+            for r in range(self.rows):
+                for c in range(self.columns):
+                    end_r, end_c = r + (self.connect - 1) * dr, c + (self.connect - 1) * dc
+                    if not (0 <= end_r < self.rows and 0 <= end_c < self.columns):
+                        continue
+                    if all(self.grid[r + i * dr][c + i * dc] == piece for i in range(self.connect)):
+                        return True
+        return False
+
+    def is_full(self) -> bool:
+        return all(self.grid[0][col] != " " for col in range(self.columns))
+
+    def completes_line(self, row: int, col: int, piece: str) -> bool:
+        """Whether a piece at the cell would have connect in a row, counting along each line through it."""
+        for dr, dc in ((0, 1), (1, 0), (-1, 1), (1, 1)):
+            count = 1
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < self.rows and 0 <= c < self.columns and self.grid[r][c] == piece:
+                    count += 1
+                    r, c = r + sign * dr, c + sign * dc
+            if count >= self.connect:
+                return True
+        return False
+
+
+class Skipped(Exception):
+    """Raised by a check that cannot run here, with the reason."""
+
+
+def check(condition: bool, message: str) -> None:
+    if not condition:
+        raise AssertionError(message)
+
+
+def check_board(games: int, rng: random.Random) -> int:
+    """Plays random games on both boards, taking moves back now and then. Returns the positions compared."""
+    positions = 0
+    for game in range(games):
+        rows, columns, connect = rng.choice(GEOMETRIES)
+        board = Board(rows, columns, connect)
+        pieces = ("X", "O") if game % 2 == 0 else ("O", "X")
+        reference = ReferenceBoard(rows, columns, connect)
+        history = [(board.hash, board.mirror_hash)]
+
+        while True:
+            where = f"{rows}x{columns} connect {connect}, moves {''.join(str(col) for col, _ in board.moves)!r}"
+            positions += 1
+            check(board.grid == reference.grid, f"grid differs at {where}")
+            check(board.is_full() == reference.is_full(), f"is_full differs at {where}")
+            for piece in pieces:
+                check(board.winning_move(piece) == reference.winning_move(piece),
+                      f"winning_move({piece!r}) differs at {where}")
+            for col in range(-1, columns + 1):
+                check(board.is_valid_move(col) == reference.is_valid_move(col),
+                      f"is_valid_move({col}) differs at {where}")
+            for col in range(columns):
+                check(board.get_next_open_row(col) == reference.get_next_open_row(col),
+                      f"get_next_open_row({col}) differs at {where}")
+            mirrored = [row[::-1] for row in reference.grid]
+            check(board.is_symmetric() == (mirrored == reference.grid), f"is_symmetric differs at {where}")
+            check((board.hash, board.mirror_hash) == history[-1], f"hash differs at {where}")
+
+            if reference.is_full() or any(reference.winning_move(piece) for piece in pieces):
+                break
+
+            if board.moves and rng.random() < 0.1:
+                col, _ = board.moves[-1]
+                board.undo()
+                top = next(row for row in range(rows) if reference.grid[row][col] != " ")
+                reference.grid[top][col] = " "
+                history.pop()
+                check((board.hash, board.mirror_hash) == history[-1], f"hash not restored by undo at {where}")
+                continue
+
+            col = rng.choice([col for col in range(columns) if reference.is_valid_move(col)])
+            piece = pieces[len(board.moves) % 2]
+            row = reference.get_next_open_row(col)
+            board.drop_piece(row, col, piece)
+            reference.drop_piece(row, col, piece)
+            rebuilt = Board.from_moves("".join(str(col) for col, _ in board.moves), pieces[0], rows, columns, connect)
+            history.append((rebuilt.hash, rebuilt.mirror_hash))
+    return positions
+
+
+def check_evaluator(games: int, rng: random.Random) -> int:
+    """Plays random games to the end, wins or not, taking moves back now and then. Returns the positions compared."""
+    positions = 0
+    for _ in range(games):
+        rows, columns, connect = rng.choice(GEOMETRIES)
+        board = Board(rows, columns, connect)
+        evaluators = [
+            IncrementalEvaluator(board, "X"),
+            IncrementalEvaluator(board, "O", CUSTOM_WEIGHTS),
+        ]
+
+        while not board.is_full():
+            if board.moves and rng.random() < 0.2:
+                for evaluator in evaluators:
+                    evaluator.pop(board)
+                board.undo()
+            else:
+                col = rng.choice([col for col in range(columns) if board.is_valid_move(col)])
+                board.play(col, board.next_piece())
+                for evaluator in evaluators:
+                    evaluator.push(board)
+
+            where = f"{rows}x{columns} connect {connect}, moves {''.join(str(col) for col, _ in board.moves)!r}"
+            positions += 1
+            for evaluator in evaluators:
+                expected = score_position(board, evaluator.piece, evaluator.weights)
+                check(evaluator.score == expected,
+                      f"score for {evaluator.piece!r} is {evaluator.score}, not {expected}, at {where}")
+                fresh = IncrementalEvaluator(board, evaluator.piece, evaluator.weights).score
+                check(fresh == expected, f"new evaluator for {evaluator.piece!r} scores {fresh}, not {expected}, at {where}")
+    return positions
+
+
+def check_threats(games: int, rng: random.Random) -> int:
+    """Plays random games until somebody wins or the board fills up. Returns the positions compared."""
+    positions = 0
+    for _ in range(games):
+        rows, columns, connect = rng.choice(GEOMETRIES)
+        board = Board(rows, columns, connect)
+        reference = ReferenceBoard(rows, columns, connect)
+
+        while True:
+            where = f"{rows}x{columns} connect {connect}, moves {''.join(str(col) for col, _ in board.moves)!r}"
+            positions += 1
+            for piece in Board.PIECES:
+                expected = [(row, col) for row in range(rows) for col in range(columns)
+                            if reference.grid[row][col] == " " and reference.completes_line(row, col, piece)]
+                squares = ThreatAnalyzer.winning_squares(board, piece)
+                check(squares == expected, f"winning squares of {piece!r} are {squares}, not {expected}, at {where}")
+
+            piece = board.next_piece()
+            col = rng.choice([col for col in range(columns) if reference.is_valid_move(col)])
+            reference.drop_piece(reference.get_next_open_row(col), col, piece)
+            board.play(col, piece)
+            if reference.winning_move(piece) or reference.is_full():
+                break
+    return positions
+
+
+def check_batch(games: int, rng: random.Random) -> int:
+    """Plays random games and scores all their positions in one batch per game. Returns the positions compared."""
+    try:
+        import numpy as np
+        from batch_evaluation import BatchEvaluator
+    except ImportError:
+        raise Skipped("NumPy is not installed")
+
+    positions = 0
+    for _ in range(games):
+        rows, columns, connect = rng.choice(BATCH_GEOMETRIES)
+        board = Board(rows, columns, connect)
+        evaluators = [BatchEvaluator(geometry=board.geometry), BatchEvaluator(CUSTOM_WEIGHTS, board.geometry)]
+        played = []
+        while True:
+            played.append(board.copy())
+            piece = board.next_piece()
+            board.play(rng.choice([col for col in range(columns) if board.is_valid_move(col)]), piece)
+            if board.winning_move(piece) or board.is_full():
+                played.append(board)
+                break
+
+        positions += len(played)
+        for evaluator in evaluators:
+            for piece in Board.PIECES:
+                opponent = "X" if piece == "O" else "O"
+                values = {piece: 1, opponent: -1, " ": 0}
+                cells = np.array([[[values[cell] for cell in row] for row in position.grid] for position in played],
+                                 dtype=np.int8)
+                by_arrays = evaluator.score_arrays(cells).tolist()
+                by_bitboards = evaluator.score_bitboards([position.bitboards[piece] for position in played],
+                                                         [position.bitboards[opponent] for position in played]).tolist()
+                for position, from_arrays, from_bitboards in zip(played, by_arrays, by_bitboards):
+                    where = f"{rows}x{columns} connect {connect}, moves {''.join(str(col) for col, _ in position.moves)!r}"
+                    expected = score_position(position, piece, evaluator.weights)
+                    check(from_arrays == expected,
+                          f"score_arrays() for {piece!r} is {from_arrays}, not {expected}, at {where}")
+                    check(from_bitboards == expected,
+                          f"score_bitboards() for {piece!r} is {from_bitboards}, not {expected}, at {where}")
+    return positions
+
+
+def reference_score(board: Board, piece: str) -> int:
+    """Exact score of the position for piece, to move, found by searching every move to the end.
+
+    Scores are those of the Solver: a win with the player's last piece scores 1, and the
+    sooner the win, the larger the score.
+    """
+    opponent = "X" if piece == "O" else "O"
+    moves = len(board.moves)
+    columns = [col for col in range(board.columns) if board.is_valid_move(col)]
+    for col in columns:
+        board.play(col, piece)
+        won = board.winning_move(piece)
+        board.undo()
+        if won:
+            return (board.geometry.cells + 1 - moves) // 2
+    if not columns:
+        return 0
+
+    best = None
+    for col in columns:
+        board.play(col, piece)
+        score = -reference_score(board, opponent)
+        board.undo()
+        best = score if best is None else max(best, score)
+    return best
+
+
+def reference_search(board: Board, depth: int, piece: str, ai_piece: str, threats: ThreatAnalyzer) -> float:
+    """Value of a position for piece, the player to move, searching every move to depth.
+
+    Leaves are scored for ai_piece like the search does: score_position() plus the threat
+    score. A move that lets the opponent win at once is lost, however little depth is left.
+    """
+    if board.is_full() or depth == 0:
+        score = score_position(board, ai_piece) + threats.score(board, ai_piece)
+        return score if piece == ai_piece else -score
+    return max(reference_move_value(board, col, depth, piece, ai_piece, threats)
+               for col in range(board.columns) if board.is_valid_move(col))
+
+
+def reference_move_value(board: Board, col: int, depth: int, piece: str, ai_piece: str, threats: ThreatAnalyzer) -> float:
+    """Value for piece of playing col, searching the rest of the depth with reference_search()."""
+    opponent = "X" if piece == "O" else "O"
+    board.play(col, piece)
+    if board.winning_move(piece):
+        value = win_score(board)
+    elif any(board.is_valid_move(reply) and _wins_with(board, reply, opponent) for reply in range(board.columns)):
+        # The opponent's winning reply makes the board one piece fuller
+        value = -(WIN_SCORE - len(board.moves) - 1)
+    else:
+        value = -reference_search(board, depth - 1, opponent, ai_piece, threats)
+    board.undo()
+    return value
+
+
+def _wins_with(board: Board, col: int, piece: str) -> bool:
+    board.play(col, piece)
+    won = board.winning_move(piece)
+    board.undo()
+    return won
+
+
+def check_search(games: int, rng: random.Random) -> int:
+    """Searches random positions that nobody has won yet. Returns the positions compared.
+
+    Each board size keeps one transposition table for all its searches, so entries stored by
+    other positions, and by mirror images, are read back.
+    """
+    positions = 0
+    threats = ThreatAnalyzer()
+    tables = {}
+    caches = {}
+    per_geometry = max(1, games // 10)
+    for rows, columns, connect in GEOMETRIES:
+        found = 0
+        while found < per_geometry:
+            board = random_position(rows, columns, connect, 0, rows * columns // 2, rng)
+            if board is None:
+                continue
+            found += 1
+            positions += 1
+            depth = rng.randint(1, SEARCH_MAX_DEPTH)
+            piece = board.next_piece()
+            opponent = "X" if piece == "O" else "O"
+            where = f"{rows}x{columns} connect {connect}, depth {depth}, moves {''.join(str(col) for col, _ in board.moves)!r}"
+
+            def context() -> SearchContext:
+                # Leaf scores are for the searching piece, so each piece has its own cache
+                return SearchContext(
+                    table=tables.setdefault(board.geometry, TranspositionTable()),
+                    ordering=MoveOrdering(columns=columns),
+                    evaluator=IncrementalEvaluator(board, piece),
+                    threats=threats,
+                    eval_cache=caches.setdefault((board.geometry, piece), EvaluationCache()),
+                    exact_depth=True
+                )
+
+            expected = reference_search(board, depth, piece, piece, threats)
+            col, value = minimax(board, depth, -math.inf, math.inf, True, piece, opponent, context())
+            check(value == expected, f"minimax() scores {value}, not {expected}, at {where}")
+            achieved = reference_move_value(board, col, depth, piece, piece, threats)
+            check(achieved == expected, f"minimax() plays {col}, which scores {achieved}, not {expected}, at {where}")
+
+            col, value, _ = iterative_deepening(board, math.inf, piece, opponent, depth, context())
+            check(value == expected, f"iterative_deepening() scores {value}, not {expected}, at {where}")
+            achieved = reference_move_value(board, col, depth, piece, piece, threats)
+            check(achieved == expected,
+                  f"iterative_deepening() plays {col}, which scores {achieved}, not {expected}, at {where}")
+    return positions
+
+
+def random_position(rows: int, columns: int, connect: int, fewest: int, most: int, rng: random.Random) -> Board | None:
+    """A board after a random number of random moves, or None if somebody won or it filled up."""
+    board = Board(rows, columns, connect)
+    for _ in range(rng.randint(fewest, most)):
+        piece = board.next_piece()
+        board.play(rng.choice([col for col in range(columns) if board.is_valid_move(col)]), piece)
+        if board.winning_move(piece) or board.is_full():
+            return None
+    return board
+
+
+def check_solver(games: int, rng: random.Random) -> int:
+    """Solves random positions that nobody has won yet. Returns the positions compared."""
+    positions = 0
+    per_geometry = max(1, games // 20)
+    for (rows, columns, connect), (fewest, most) in SOLVER_GEOMETRIES.items():
+        solver = Solver(geometry=Board(rows, columns, connect).geometry)
+        found = 0
+        while found < per_geometry:
+            board = random_position(rows, columns, connect, fewest, most, rng)
+            if board is None:
+                continue
+            found += 1
+            positions += 1
+            piece = board.next_piece()
+            opponent = "X" if piece == "O" else "O"
+            where = f"{rows}x{columns} connect {connect}, moves {''.join(str(col) for col, _ in board.moves)!r}"
+
+            expected = reference_score(board, piece)
+            current = board.bitboards[piece]
+            score = solver.solve(current, current | board.bitboards[opponent], len(board.moves))
+            check(score == expected, f"solve() scores {score}, not {expected}, at {where}")
+
+            col, score = solver.best_move(board, piece)
+            check(score == expected, f"best_move() scores {score}, not {expected}, at {where}")
+            board.play(col, piece)
+            won = board.winning_move(piece)
+            achieved = (board.geometry.cells + 2 - len(board.moves)) // 2 if won else -reference_score(board, opponent)
+            board.undo()
+            check(achieved == expected, f"best_move() plays {col}, which scores {achieved}, not {expected}, at {where}")
+    return positions
+
+
+def reference_plies(score: int, moves: int, cells: int) -> int:
+    """Moves left until the game ends, with the score the reference negamax gives a won or lost position."""
+    winner_moves = moves if score > 0 else moves + 1
+    # Try each of the winner's pieces in turn until one wins with the score
+    piece = 1
+    while (cells + 1 - (winner_moves + 2 * (piece - 1))) // 2 != abs(score):
+        piece += 1
+    return 2 * piece - 1 if score > 0 else 2 * piece
+
+
+def check_server(games: int, rng: random.Random) -> int:
+    """Answers requests as a server worker would. Returns the positions compared."""
+    server._init_worker()
+    positions = 0
+    for request, expected in SERVER_REQUESTS:
+        positions += 1
+        response = server._search(server.parse_request(json.dumps(request)))
+        for field, value in expected.items():
+            check(response.get(field) == value,
+                  f"{request} answers {field} {response.get(field)!r}, not {value!r}")
+
+    per_geometry = max(1, games // 20)
+    for (rows, columns, connect), (fewest, most) in SOLVER_GEOMETRIES.items():
+        found = 0
+        while found < per_geometry:
+            board = random_position(rows, columns, connect, fewest, most, rng)
+            if board is None:
+                continue
+            found += 1
+            positions += 1
+            moves = "".join(str(col) for col, _ in board.moves)
+            where = f"{rows}x{columns} connect {connect}, moves {moves!r}"
+            request = {"moves": moves, "difficulty": "solver", "rows": rows, "columns": columns, "connect": connect}
+            response = server._search(server.parse_request(json.dumps(request)))
+
+            expected = reference_score(board, board.next_piece())
+            if expected == 0:
+                check(response["score"] == 0 and "plies" not in response,
+                      f"answers {response['score']!r} for a draw at {where}")
+                continue
+            outcome = "win" if expected > 0 else "loss"
+            plies = reference_plies(expected, len(board.moves), board.geometry.cells)
+            check(response["score"] == outcome, f"answers {response['score']!r}, not {outcome!r}, at {where}")
+            check(response.get("plies") == plies, f"answers {response.get('plies')} plies, not {plies}, at {where}")
+    return positions
+
+
+CHECKS = {
+    "board": check_board,
+    "evaluator": check_evaluator,
+    "batch": check_batch,
+    "threats": check_threats,
+    "search": check_search,
+    "solver": check_solver,
+    "server": check_server,
+}
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Check the engine against reference implementations.")
+    parser.add_argument("checks", nargs="*", help=f"Checks to run, from {', '.join(CHECKS)}. Defaults to all of them.")
+    parser.add_argument("--games", type=int, default=300, help="Random games per check; the solver solves one position per 20 games on each board size.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+    for name in args.checks:
+        if name not in CHECKS:
+            parser.error(f"unknown check {name!r}")
+
+    for name in args.checks or CHECKS:
+        rng = random.Random(args.seed)
+        try:
+            positions = CHECKS[name](args.games, rng)
+        except Skipped as reason:
+            sys.stdout.write(f"{name}: skipped, {reason}\n")
+            continue
+        except AssertionError as error:
+            sys.stdout.write(f"{name}: FAILED: {error}\n")
+            sys.exit(1)
+        sys.stdout.write(f"{name}: ok, {positions} positions\n")
+
+
+if __name__ == "__main__":
+    main()